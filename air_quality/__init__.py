@@ -0,0 +1,17 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Package Description: Shared data-loading and analysis helpers used by the
+# Streamlit pages in 'pages/'
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+from air_quality.loader import (
+    COMBINED_FILE,
+    POLLUTANTS,
+    POLLUTANT_COLUMNS,
+    load_combined,
+    load_pollutant,
+    load_raw_sample,
+)
@@ -0,0 +1,191 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Incremental per-site, per-pollutant aggregates (count, mean,
+# M2 and max) kept with Welford's online algorithm. New readings are merged into the
+# stored aggregates in time proportional to the number of new readings. The
+# aggregates of the pages are kept in one file next to a manifest of the raw files
+# merged into them: only the files that changed since are read, and only their new
+# readings are merged. A site and pollutant whose earlier readings were revised or
+# backfilled is recalculated from its own readings.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from air_quality.build import _atomic_write, input_hashes
+from air_quality.loader import CACHE_DIR, POLLUTANTS, _write_cache, load_pollutants
+from air_quality.poc import POC_POLICY, collapse_poc
+from air_quality.store import to_long
+
+# Only one thread updates the saved aggregates at a time
+_update_lock = threading.Lock()
+
+
+# Returning the file holding the saved aggregates, the readings depend on how duplicate instruments are collapsed so
+# every POC policy has its own file. The manifest next to it has the same name with '.manifest.json'
+def aggregates_file(policy=POC_POLICY):
+    return CACHE_DIR / f'aggregates_{policy}.parquet'
+
+
+# Hashing the date and concentration of every reading. The hashes of a group's readings are summed (wrapping around)
+# into an order independent digest, which changes when one of its readings is added, removed or revised
+def reading_hashes(readings):
+    values = pd.DataFrame({'Date': readings['Date'].to_numpy().astype('datetime64[ns]'),
+                           'Concentration': readings['Concentration'].to_numpy(dtype='float64')})
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+# Class holding the running aggregates, one row of (Count, Mean, M2, Max, Last Date, Digest) per (Site ID, Pollutant).
+# 'Last Date' is the latest reading merged so far and 'Digest' is the digest of all readings merged so far
+class OnlineAggregates:
+
+    def __init__(self, state=None):
+        if state is None:
+            index = pd.MultiIndex.from_arrays([[], []], names=['Site ID', 'Pollutant'])
+            state = pd.DataFrame({'Count': pd.Series(dtype='int64'), 'Mean': pd.Series(dtype='float64'),
+                                  'M2': pd.Series(dtype='float64'), 'Max': pd.Series(dtype='float64'),
+                                  'Last Date': pd.Series(dtype='datetime64[ns]'),
+                                  'Digest': pd.Series(dtype='uint64')}, index=index)
+        self.state = state
+
+    # Merging readings in long format (Date, Site ID, Pollutant, Concentration) into the aggregates. Every reading passed
+    # is counted, finding the readings that were not merged yet is up to the caller (see merge_pollutant below).
+    # Returns the number of readings merged
+    def update(self, new_readings):
+        new_readings = new_readings.dropna(subset=['Concentration'])
+        if new_readings.empty:
+            return 0
+        new_readings = new_readings.assign(Pollutant=new_readings['Pollutant'].astype(str),
+                                           Hash=reading_hashes(new_readings))
+
+        # Aggregating the new readings of every group in one pass, M2 is the sum of squared differences from the mean
+        grouped = new_readings.groupby(['Site ID', 'Pollutant'])['Concentration']
+        batch = pd.DataFrame({'Count': grouped.count(), 'Mean': grouped.mean(), 'Max': grouped.max()})
+        batch['M2'] = grouped.var(ddof=0).fillna(0) * batch['Count']
+        batch['Last Date'] = new_readings.groupby(['Site ID', 'Pollutant'])['Date'].max()
+        batch['Digest'] = new_readings.groupby(['Site ID', 'Pollutant'])['Hash'].sum()
+
+        # Combining the stored and the new aggregates (Chan et al.'s parallel form of Welford's algorithm)
+        old = self.state.reindex(self.state.index.union(batch.index))
+        new = batch.reindex(old.index)
+        count_a = old['Count'].fillna(0).to_numpy(dtype=float)
+        count_b = new['Count'].fillna(0).to_numpy(dtype=float)
+        count = count_a + count_b
+        delta = new['Mean'].fillna(0).to_numpy() - old['Mean'].fillna(0).to_numpy()
+        mean = old['Mean'].fillna(0).to_numpy() + delta * np.divide(count_b, count, out=np.zeros_like(count), where=count > 0)
+        m2 = (old['M2'].fillna(0).to_numpy() + new['M2'].fillna(0).to_numpy()
+              + delta ** 2 * np.divide(count_a * count_b, count, out=np.zeros_like(count), where=count > 0))
+
+        self.state = pd.DataFrame({
+            'Count': count.astype('int64'),
+            'Mean': mean,
+            'M2': m2,
+            'Max': np.fmax(old['Max'].to_numpy(), new['Max'].to_numpy()),
+            'Last Date': pd.concat([old['Last Date'], new['Last Date']], axis=1).max(axis=1),
+            # Reindexing the digests with a fill value keeps them as unsigned integers, the sum wraps around
+            'Digest': (self.state['Digest'].reindex(old.index, fill_value=0).to_numpy()
+                       + batch['Digest'].reindex(old.index, fill_value=0).to_numpy()),
+        }, index=old.index)
+        return len(new_readings)
+
+    # Merging the current readings of one pollutant (all of them, in long format) into the aggregates.
+    # Readings after the last merged date of their site are new and are merged as they are. When the readings up to that
+    # date no longer add up to the digest of what was merged (a reading was revised, backfilled or removed), the site's
+    # aggregates of the pollutant are recalculated from all its readings.
+    # Returns the number of readings merged and the number of recalculated (site, pollutant) groups
+    def merge_pollutant(self, readings, pollutant):
+        readings = readings.dropna(subset=['Concentration']).assign(Pollutant=pollutant)
+        keys = pd.MultiIndex.from_frame(readings[['Site ID', 'Pollutant']])
+        last_dates = self.state['Last Date'].reindex(keys).to_numpy()
+        merged_before = ~pd.isna(last_dates) & (readings['Date'].to_numpy() <= last_dates)
+
+        # Comparing the digest of the readings merged before with the stored one, a group missing from the readings
+        # has a digest of zero
+        digests = readings[merged_before].assign(Hash=reading_hashes(readings[merged_before]))
+        digests = digests.groupby(['Site ID', 'Pollutant'])['Hash'].sum()
+        stored = self.state.loc[self.state.index.get_level_values('Pollutant') == pollutant, 'Digest']
+        revised = stored.index[stored.to_numpy() != digests.reindex(stored.index, fill_value=0).to_numpy()]
+
+        self.state = self.state.drop(revised)
+        merged = self.update(readings[~merged_before | keys.isin(revised)])
+        return merged, len(revised)
+
+    # Returning the aggregates per site name (several Site IDs can share a name) and pollutant, with the variance
+    def by_site_name(self, sites):
+        state = self.state.reset_index()
+        state['Local Site Name'] = state['Site ID'].map(sites.set_index('Site ID')['Local Site Name'])
+        state['Sum'] = state['Mean'] * state['Count']
+        grouped = state.groupby(['Local Site Name', 'Pollutant'])
+        table = grouped.agg(Count=('Count', 'sum'), Sum=('Sum', 'sum'), Max=('Max', 'max'))
+        table['Mean'] = table['Sum'] / table['Count']
+        # The M2 of the combined groups also includes the spread of the group means around the combined mean
+        state = state.join(table['Mean'].rename('Name Mean'), on=['Local Site Name', 'Pollutant'])
+        state['Spread'] = state['M2'] + state['Count'] * (state['Mean'] - state['Name Mean']) ** 2
+        table['Variance'] = state.groupby(['Local Site Name', 'Pollutant'])['Spread'].sum() / (table['Count'] - 1)
+        return table[['Count', 'Mean', 'Variance', 'Max']].reset_index()
+
+    # Returning a table of one statistic with a row per site name and a column per pollutant concentration
+    def pivot(self, sites, statistic='Mean'):
+        table = self.by_site_name(sites).pivot(index='Local Site Name', columns='Pollutant', values=statistic)
+        table = table.reindex(columns=list(POLLUTANTS))
+        table.columns = [POLLUTANTS[pollutant]['column'] for pollutant in table.columns]
+        return table.reset_index()
+
+    # Saving the aggregates to a file. Files of earlier releases named after a data version are removed
+    def save(self, path=None):
+        path = path or aggregates_file()
+        frame = self.state.reset_index()
+        _write_cache(frame, path, path.stem)
+
+    # Loading saved aggregates, starting empty when there are none or when they were saved without digests
+    @classmethod
+    def load(cls, path=None):
+        path = path or aggregates_file()
+        if not path.exists():
+            return cls()
+        state = pd.read_parquet(path)
+        if 'Digest' not in state:
+            return cls()
+        return cls(state.set_index(['Site ID', 'Pollutant']))
+
+
+# Reading the content hashes of the raw files merged into the saved aggregates, keyed on the file's name
+def _read_manifest(path):
+    try:
+        return json.loads(path.read_text()).get('inputs', {})
+    except (OSError, ValueError):
+        return {}
+
+
+# Loading the saved aggregates and merging the raw files that changed since they were saved (by their content hash).
+# Unchanged files are not read, and of a changed file only the new readings are merged, plus the sites whose earlier
+# readings were revised (see merge_pollutant above). The manifest is written after the aggregates, so if saving stops
+# in between the file is read again next time and its readings are found to be merged already
+def refresh_aggregates(policy=POC_POLICY):
+    with _update_lock:
+        path = aggregates_file(policy)
+        manifest_file = path.with_suffix('.manifest.json')
+        aggregates = OnlineAggregates.load(path)
+        merged_inputs = _read_manifest(manifest_file) if path.exists() else {}
+        inputs = input_hashes()
+        changed = [pollutant for pollutant, spec in POLLUTANTS.items()
+                   if merged_inputs.get(spec['file']) != inputs[spec['file']]]
+        if not changed:
+            return aggregates
+
+        for pollutant, frame in load_pollutants(pollutants=changed).items():
+            aggregates.merge_pollutant(to_long({pollutant: collapse_poc(frame, pollutant, policy)}), pollutant)
+        aggregates.save(path)
+        try:
+            _atomic_write(manifest_file, lambda file: json.dump({'inputs': inputs, 'poc_policy': policy}, file, indent=2))
+        except OSError:
+            pass
+        return aggregates
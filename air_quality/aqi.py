@@ -0,0 +1,101 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Vectorized Air Quality Index (AQI) calculations. AQI values are
+# binned into the EPA categories with a breakpoint table, and the AQI is calculated
+# from the concentration of every pollutant using the EPA breakpoint tables, for
+# whole columns at once.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+# AQI categories and the highest AQI value of each category, the last category has no upper limit
+AQI_CATEGORIES = ['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
+AQI_CATEGORY_UPPER = [50, 100, 150, 200, 300]
+
+# Index range of every breakpoint row
+AQI_LOW = np.array([0, 51, 101, 151, 201, 301], dtype=float)
+AQI_HIGH = np.array([50, 100, 150, 200, 300, 500], dtype=float)
+
+# EPA concentration breakpoints (low end of every row, and high end of the last row) in the units of the daily files.
+# PM2.5 uses the breakpoints revised in 2024, which the EPA also used for the 2023 daily AQI values.
+# Concentrations are truncated to the given number of decimals before the breakpoints are applied.
+# Lead has no AQI
+AQI_BREAKPOINTS = {
+    'PM2.5': {'low': [0.0, 9.1, 35.5, 55.5, 125.5, 225.5], 'top': 325.4, 'decimals': 1},
+    'Ozone': {'low': [0.0, 0.055, 0.071, 0.086, 0.106, 0.201], 'top': 0.604, 'decimals': 3},
+    'SO2': {'low': [0, 36, 76, 186, 305, 605], 'top': 1004, 'decimals': 0},
+    'NO2': {'low': [0, 54, 101, 361, 650, 1250], 'top': 2049, 'decimals': 0},
+    'CO': {'low': [0.0, 4.5, 9.5, 12.5, 15.5, 30.5], 'top': 50.4, 'decimals': 1},
+    'PM10': {'low': [0, 55, 155, 255, 355, 425], 'top': 604, 'decimals': 0},
+}
+
+
+# Binning AQI values into the EPA categories, returning an ordered categorical (missing values stay missing)
+def categorize_aqi(aqi_values):
+    values = np.asarray(aqi_values, dtype=float)
+    codes = np.searchsorted(AQI_CATEGORY_UPPER, values, side='left')
+    codes[np.isnan(values)] = -1
+    return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(AQI_CATEGORIES, ordered=True))
+
+
+# Stacking the breakpoint tables into arrays with one row per pollutant, so every reading can pick its own table
+def _breakpoint_arrays(pollutants):
+    low = np.full((len(pollutants), len(AQI_LOW)), np.nan)
+    high = np.full_like(low, np.nan)
+    scale = np.ones(len(pollutants))
+    for row, pollutant in enumerate(pollutants):
+        table = AQI_BREAKPOINTS.get(pollutant)
+        if table is None:
+            continue
+        decimals = table['decimals']
+        low[row] = table['low']
+        # The high end of a row is just below the low end of the next one, at the truncation precision
+        high[row, :-1] = np.array(table['low'][1:]) - 10.0 ** -decimals
+        high[row, -1] = table['top']
+        scale[row] = 10.0 ** decimals
+    return low, high, scale
+
+
+# Calculating the AQI from concentrations. pollutants is either one pollutant's name for all values, or an array with the
+# pollutant of every value (e.g. the 'Pollutant' column of the long store), so all pollutants are calculated in one call.
+# Pollutants without an AQI (lead) and missing concentrations give NaN, and values above the top of the table give 500
+def concentration_aqi(concentrations, pollutants):
+    concentrations = np.asarray(concentrations, dtype=float)
+    if isinstance(pollutants, str):
+        names = [pollutants]
+        codes = np.zeros(len(concentrations), dtype=int)
+    else:
+        codes, names = pd.factorize(np.asarray(pollutants, dtype=object))
+    low, high, scale = _breakpoint_arrays(list(names))
+
+    # Truncating each concentration to its pollutant's precision, negative readings count as zero.
+    # The scaled value is rounded first so a concentration stored just below its decimal value (e.g. 0.07 as a float32)
+    # is not truncated to the previous step
+    scale = scale[codes]
+    truncated = np.floor(np.round(np.clip(concentrations, 0, None) * scale, 4)) / scale
+    truncated = np.minimum(truncated, high[codes, -1])
+
+    # Finding the breakpoint row of every concentration, comparing against the low ends of its own table
+    row = (truncated[:, None] >= low[codes]).sum(axis=1) - 1
+    row = np.clip(row, 0, len(AQI_LOW) - 1)
+    c_low = low[codes, row]
+    c_high = high[codes, row]
+
+    aqi = (AQI_HIGH[row] - AQI_LOW[row]) / (c_high - c_low) * (truncated - c_low) + AQI_LOW[row]
+    # Rounding half up like the EPA does
+    return np.floor(aqi + 0.5)
+
+
+# Calculating the AQI of every pollutant column of a wide table in one call. columns maps the pollutant's name to its
+# column, pollutants without an AQI are skipped. Returns one AQI column per pollutant, named after the pollutant
+def wide_aqi(wide, columns):
+    names = [pollutant for pollutant in columns if pollutant in AQI_BREAKPOINTS]
+    values = wide[[columns[pollutant] for pollutant in names]].to_numpy(dtype=float)
+    aqi = concentration_aqi(values.ravel(), np.tile(np.array(names, dtype=object), len(wide)))
+    return pd.DataFrame(aqi.reshape(values.shape), columns=names, index=wide.index)
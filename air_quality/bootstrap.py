@@ -0,0 +1,163 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Bootstrapping the mean of a pollutant. Resamples are drawn in
+# blocks with numpy's random Generator and the means of a whole block are computed
+# with one matrix operation. The block size is limited by a memory ceiling.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Default memory ceiling for one block of resamples (64 MB)
+DEFAULT_MAX_BYTES = 64 * 2**20
+
+
+# Returning how many resamples of n values fit in the memory ceiling.
+# Every resampled value needs a 4 byte index and an 8 byte copy of the value
+def block_size(n, max_bytes=DEFAULT_MAX_BYTES):
+    return max(1, int(max_bytes // (12 * max(n, 1))))
+
+
+# Calculating the lower and upper percentile bounds of a confidence level
+def confidence_bounds(means, conf_lev):
+    lower_conf = (100 - conf_lev) / 2
+    upper_conf = 100 - lower_conf
+    return np.percentile(means, lower_conf), np.percentile(means, upper_conf)
+
+
+# Drawing n_iterations resample means of data, block by block so at most max_bytes are used at once
+def resample_means(data, n_iterations, rng, max_bytes=DEFAULT_MAX_BYTES):
+    sample_size = len(data)
+    means = np.empty(n_iterations)
+    step = block_size(sample_size, max_bytes)
+    for start in range(0, n_iterations, step):
+        stop = min(start + step, n_iterations)
+        # Every row of the block is one resample drawn with replacement
+        indices = rng.integers(0, sample_size, size=(stop - start, sample_size), dtype=np.int32)
+        means[start:stop] = np.take(data, indices).mean(axis=1)
+    return means
+
+
+# Drawing n_iterations resample means with Poisson(1) weights instead of resampling indices.
+# Every value gets an independent Poisson(1) count in every resample, which approximates drawing n values with replacement
+# without knowing n in advance. The values are read one chunk at a time (a single array or series, or any iterable of
+# arrays, e.g. chunks read from disk) and only the running weighted sum and total weight of every resample are kept, so
+# besides the block of weights (capped by max_bytes) the memory used grows with n_iterations and not with the number of values
+def poisson_resample_means(chunks, n_iterations, rng, max_bytes=DEFAULT_MAX_BYTES):
+    if isinstance(chunks, (np.ndarray, pd.Series)):
+        chunks = [chunks]
+    weighted_sums = np.zeros(n_iterations)
+    total_weights = np.zeros(n_iterations)
+    # Every weight takes 16 bytes (the integer count and its float copy), so this many values of a chunk are weighted at once
+    step = max(1, int(max_bytes // (16 * n_iterations)))
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        chunk = chunk[~np.isnan(chunk)]
+        for start in range(0, len(chunk), step):
+            values = chunk[start:start + step]
+            weights = rng.poisson(1.0, size=(n_iterations, len(values))).astype(float)
+            weighted_sums += weights @ values
+            total_weights += weights.sum(axis=1)
+    if not total_weights.any():
+        raise ValueError('Cannot bootstrap the mean of an empty sample')
+    # A resample whose weights are all zero has no mean, this only happens for very small samples
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = weighted_sums / total_weights
+    return means[total_weights > 0]
+
+
+# Function to perform bootstrapping for the mean using numpy
+# setting default values for the iterations(samples) and CI.
+# The same seed gives the same means and bounds, and max_bytes caps the memory used by one block of resamples.
+# method='poisson' uses the streaming Poisson bootstrap above, data can then also be an iterable of chunks
+def bootstrap_mean(data, n_iterations=1000, conf_lev=95, seed=None, max_bytes=DEFAULT_MAX_BYTES, method='resample'):
+    rng = np.random.default_rng(seed)
+    if method == 'poisson':
+        means = poisson_resample_means(data, n_iterations, rng, max_bytes)
+    elif method == 'resample':
+        data = np.asarray(data, dtype=float)
+        if len(data) == 0:
+            raise ValueError('Cannot bootstrap the mean of an empty sample')
+        means = resample_means(data, n_iterations, rng, max_bytes)
+    else:
+        raise ValueError(f"Unknown bootstrap method '{method}', expected 'resample' or 'poisson'")
+
+    # calculating lower and upper CI bounds
+    lower_bound, upper_bound = confidence_bounds(means, conf_lev)
+    # returning means, lower bound, and upper bound
+    return means, lower_bound, upper_bound
+
+
+# Bootstrapping the mean in rounds of round_size resamples until the confidence interval has converged.
+# After every round the bounds are recalculated from all resamples so far, and resampling stops when neither bound moved
+# by more than tol times the width of the interval since the previous round (tol=0.01 is 1% of the width, so the same
+# tolerance works for pollutants measured on very different scales), or when max_iterations resamples were drawn.
+# Returns the means, the bounds and the number of resamples actually used
+def adaptive_bootstrap_mean(data, conf_lev=95, tol=0.01, max_iterations=100000, round_size=1000, seed=None,
+                            max_bytes=DEFAULT_MAX_BYTES):
+    data = np.asarray(data, dtype=float)
+    if len(data) == 0:
+        raise ValueError('Cannot bootstrap the mean of an empty sample')
+    rng = np.random.default_rng(seed)
+
+    rounds = []
+    previous_bounds = None
+    n_used = 0
+    while n_used < max_iterations:
+        n_round = min(round_size, max_iterations - n_used)
+        rounds.append(resample_means(data, n_round, rng, max_bytes))
+        n_used += n_round
+        bounds = confidence_bounds(np.concatenate(rounds), conf_lev)
+        if previous_bounds is not None and max(abs(bounds[0] - previous_bounds[0]),
+                                               abs(bounds[1] - previous_bounds[1])) <= tol * (bounds[1] - bounds[0]):
+            break
+        previous_bounds = bounds
+
+    means = np.concatenate(rounds)
+    return means, bounds[0], bounds[1], n_used
+
+
+# ------------------------------------    All sites and pollutants    ------------------------------------
+
+# Bootstrapping one (site, pollutant) group, this runs in a worker process
+def _bootstrap_group(task):
+    site, pollutant, data, n_iterations, conf_lev, seed, max_bytes = task
+    means, lower_bound, upper_bound = bootstrap_mean(data, n_iterations, conf_lev, seed, max_bytes)
+    return {'Local Site Name': site, 'Pollutant': pollutant, 'N': len(data), 'Mean': data.mean(),
+            'Lower Bound': lower_bound, 'Upper Bound': upper_bound}
+
+
+# Calculating bootstrapped confidence intervals of the mean for every (Local Site Name, pollutant) group of the
+# combined data. pollutants maps the pollutant's name to its column. The groups are independent so they are spread
+# over a pool of n_jobs processes (all cores by default, 1 runs them in this process).
+# Every group gets its own random stream spawned from the seed so the table does not depend on the number of processes
+def bootstrap_table(combined_data, pollutants, n_iterations=1000, conf_lev=95, seed=None, n_jobs=None,
+                    max_bytes=DEFAULT_MAX_BYTES):
+    groups = []
+    for site, site_data in combined_data.groupby('Local Site Name', sort=True):
+        for pollutant, column in pollutants.items():
+            data = site_data[column].dropna().to_numpy(dtype=float)
+            if len(data) > 0:
+                groups.append((site, pollutant, data))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    tasks = [(site, pollutant, data, n_iterations, conf_lev, group_seed, max_bytes)
+             for (site, pollutant, data), group_seed in zip(groups, seeds)]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) <= 1:
+        rows = [_bootstrap_group(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            rows = list(executor.map(_bootstrap_group, tasks, chunksize=max(1, len(tasks) // (4 * n_jobs))))
+
+    columns = ['Local Site Name', 'Pollutant', 'N', 'Mean', 'Lower Bound', 'Upper Bound']
+    return pd.DataFrame(rows, columns=columns)
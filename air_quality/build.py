@@ -0,0 +1,109 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Build step for the combined dataset. The seven EPA files are
+# merged into 'pollution_data_2023_all.csv' only when one of them changes, and the
+# file is written atomically so a page never reads a half-written file.
+# Usage: python -m air_quality.build [--force]
+# Libraries needed: pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import pandas as pd
+
+from air_quality.loader import COMBINED_FILE, DATA_DIR, DATE_FORMAT, POLLUTANTS, fingerprint, load_pollutants
+from air_quality.poc import POC_POLICY, SITE_DAY, collapse_report, load_collapsed
+
+# The manifest records the content hash of every input file the combined file was built from
+MANIFEST_FILE = DATA_DIR / 'pollution_data_2023_all.manifest.json'
+
+# Only one thread of the app rebuilds the file at a time
+_build_lock = threading.Lock()
+
+
+# Mergging datasets one by one and assigning suffixes to avoid column ambiguity.
+# PM2.5 is the base table and every other pollutant is left merged on the date and site.
+# Each frame should have one row per site-day (see 'air_quality/poc.py'), otherwise duplicate keys multiply the rows
+def merge_pollutants(frames):
+    combined_data = frames['PM2.5']
+    for pollutant, spec in POLLUTANTS.items():
+        if pollutant == 'PM2.5':
+            continue
+        combined_data = pd.merge(combined_data, frames[pollutant], on=['Date', 'Site ID'], how='left',
+                                 suffixes=('', spec['suffix']))
+    return combined_data
+
+
+# Returning the content hash of every input file, keyed on the file's name
+def input_hashes():
+    return {spec['file']: fingerprint(DATA_DIR / spec['file'])[2] for spec in POLLUTANTS.values()}
+
+
+# Checking whether the combined file is missing or was built from different input files or with another POC policy
+def is_stale(policy=POC_POLICY):
+    if not (DATA_DIR / COMBINED_FILE).exists() or not MANIFEST_FILE.exists():
+        return True
+    try:
+        manifest = json.loads(MANIFEST_FILE.read_text())
+    except (OSError, ValueError):
+        return True
+    return manifest.get('inputs') != input_hashes() or manifest.get('poc_policy') != policy
+
+
+# Writing text to a file through a temporary file in the same folder and renaming it,
+# the rename is atomic so readers see either the old file or the new one.
+# mkstemp creates the file readable by its owner only, so it gets the permissions of a normally created file first
+def _atomic_write(path, write):
+    file_descriptor, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'w', newline='') as file:
+            write(file)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+# Rebuilding the combined file if an input changed (or always when force is set).
+# Returns True when the file was rebuilt
+def build_combined(force=False, policy=POC_POLICY):
+    with _build_lock:
+        if not force and not is_stale(policy):
+            return False
+        combined_data = merge_pollutants(load_collapsed(policy))
+        _atomic_write(DATA_DIR / COMBINED_FILE, lambda file: combined_data.to_csv(file, index=False, date_format=DATE_FORMAT))
+        manifest = {'inputs': input_hashes(), 'poc_policy': policy, 'rows': len(combined_data)}
+        _atomic_write(MANIFEST_FILE, lambda file: json.dump(manifest, file, indent=2, sort_keys=True))
+        return True
+
+
+# Reporting the row counts of every file before and after collapsing the POCs, and of the merged dataset with and
+# without collapsing. After collapsing, the merged dataset has exactly one row per PM2.5 site-day
+def row_count_report(policy=POC_POLICY):
+    report = collapse_report(policy)
+    raw_frames = {pollutant: frame.drop(columns='POC') for pollutant, frame in load_pollutants().items()}
+    report.loc[len(report)] = {
+        'Pollutant': 'Merged',
+        'Raw Rows': len(merge_pollutants(raw_frames)),
+        'Unique Site-Days': raw_frames['PM2.5'].groupby(SITE_DAY).ngroups,
+        'Rows After Collapse': len(merge_pollutants(load_collapsed(policy))),
+    }
+    return report
+
+
+if __name__ == '__main__':
+    rebuilt = build_combined(force='--force' in sys.argv[1:])
+    print(f'{COMBINED_FILE} ' + ('rebuilt' if rebuilt else 'is up to date'))
+    print(f'Row counts with the {POC_POLICY} POC policy:')
+    print(row_count_report().to_string(index=False))
@@ -0,0 +1,99 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Chi-square tests of independence between every pair of sites.
+# For a 2 x k table the statistic has a closed form in the two rows' counts, so the
+# statistics of all pairs are calculated with array operations on the site x AQI
+# category contingency table instead of one stats.chi2_contingency() call per pair.
+# The p-values are adjusted for multiple testing with the Holm or the
+# Benjamini-Hochberg method.
+# Libraries needed: numpy, pandas, scipy
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+# The multiple testing corrections that can be applied to the pairwise p-values
+P_VALUE_ADJUSTMENTS = ('holm', 'bh')
+
+# Number of sites compared against all others at once, limits the (block x sites x categories) arrays
+BLOCK_SIZE = 256
+
+
+# Calculating the chi-square statistic, p-value and degrees of freedom of every pair of rows (sites) of a contingency
+# table, the same values stats.chi2_contingency() gives for the 2 x k table of the two rows without its empty columns.
+# With correction=True Yates' correction is applied to pairs with one degree of freedom, like SciPy does.
+# Returns three (site x site) frames, the diagonal is NaN
+def pairwise_chi2(contingency_table, correction=True):
+    counts = contingency_table.to_numpy(dtype=float)
+    totals = counts.sum(axis=1)
+    n_sites = len(counts)
+    statistic = np.full((n_sites, n_sites), np.nan)
+    dof = np.full((n_sites, n_sites), np.nan)
+
+    for start in range(0, n_sites, BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        # Arrays of (block site, other site, category)
+        count_a = counts[block, None, :]
+        count_b = counts[None, :, :]
+        total_a = totals[block, None, None]
+        total_b = totals[None, :, None]
+        column_totals = count_a + count_b
+        grand_total = total_a + total_b
+        used = column_totals > 0
+
+        # For a 2 x k table, observed - expected of both rows of column j is +-(O_aj * R_b - O_bj * R_a) / N,
+        # and the sum of 1 / expected over the column is N^2 / (C_j * R_a * R_b)
+        difference = np.abs(count_a * total_b - count_b * total_a) / grand_total
+        pair_dof = used.sum(axis=2) - 1
+        if correction:
+            yates = (pair_dof == 1)[:, :, None]
+            difference = np.where(yates, np.maximum(difference - 0.5, 0), difference)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = np.where(used, difference ** 2 * grand_total ** 2 / (column_totals * total_a * total_b), 0)
+        statistic[block] = terms.sum(axis=2)
+        dof[block] = pair_dof
+
+    np.fill_diagonal(statistic, np.nan)
+    np.fill_diagonal(dof, np.nan)
+    # A pair without any degree of freedom (both sites only have one category) gives no evidence of a difference
+    p_value = np.where(dof > 0, stats.chi2.sf(statistic, np.maximum(dof, 1)), 1.0)
+    p_value[np.isnan(dof)] = np.nan
+
+    index = contingency_table.index
+    return (pd.DataFrame(statistic, index=index, columns=index), pd.DataFrame(p_value, index=index, columns=index),
+            pd.DataFrame(dof, index=index, columns=index))
+
+
+# Adjusting a vector of p-values for multiple testing.
+# 'holm' controls the family-wise error rate and 'bh' (Benjamini-Hochberg) the false discovery rate
+def adjust_p_values(p_values, method='holm'):
+    if method not in P_VALUE_ADJUSTMENTS:
+        raise ValueError(f"Unknown adjustment '{method}', expected one of {P_VALUE_ADJUSTMENTS}")
+    p_values = np.asarray(p_values, dtype=float)
+    n_tests = len(p_values)
+    order = np.argsort(p_values)
+    ranked = p_values[order]
+    if method == 'holm':
+        # The i-th smallest p-value is multiplied by (m - i + 1) and adjusted values never decrease
+        adjusted = np.maximum.accumulate(ranked * (n_tests - np.arange(n_tests)))
+    else:
+        # The i-th smallest p-value is multiplied by m / i and adjusted values never increase from the largest down
+        adjusted = np.minimum.accumulate((ranked * n_tests / np.arange(1, n_tests + 1))[::-1])[::-1]
+    result = np.empty(n_tests)
+    result[order] = np.minimum(adjusted, 1)
+    return result
+
+
+# Adjusting the p-values of a (site x site) matrix, every pair is counted once
+def adjust_p_matrix(p_matrix, method='holm'):
+    values = p_matrix.to_numpy(dtype=float)
+    upper = np.triu_indices(len(values), k=1)
+    adjusted = np.full_like(values, np.nan)
+    adjusted[upper] = adjust_p_values(values[upper], method)
+    adjusted.T[upper] = adjusted[upper]
+    return pd.DataFrame(adjusted, index=p_matrix.index, columns=p_matrix.columns)
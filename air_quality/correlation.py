@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Pairwise-complete covariance and correlation matrices with the
+# number of overlapping readings behind every cell. The sums needed for every pair
+# of pollutants are calculated from a mask of the available values with one pass
+# over the rows, for any number of groups (e.g. every site or every month) at once,
+# so whole stacks of matrices come out of a single call. The tables are cached per
+# data version.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+from air_quality.loader import POLLUTANTS, cached_artifact
+from air_quality.poc import POC_POLICY
+from air_quality.store import load_wide
+
+# Pollutants whose correlations are calculated, lead is measured too rarely to overlap with the others
+CORRELATION_POLLUTANTS = ['PM2.5', 'Ozone', 'SO2', 'NO2', 'CO', 'PM10']
+
+# The groups a stack of matrices can be calculated for, None gives one matrix for all rows
+CORRELATION_GROUPS = (None, 'Local Site Name', 'Month')
+
+# Number of rows whose (pollutant x pollutant) products are formed at once
+CHUNK_ROWS = 65536
+
+
+# Calculating the sums of every pair of columns over the rows where both are available, for every group of rows.
+# values is a (rows x columns) array with NaN for missing values and codes holds the group of every row (0 to n_groups - 1).
+# Returns arrays of shape (groups, columns, columns), where for a pair (i, j) 'x' is the sum of column i and 'xx' the sum
+# of its squares over the rows where column j is also available
+def moment_sums(values, codes=None, n_groups=1):
+    n_columns = values.shape[1]
+    if codes is None:
+        codes = np.zeros(len(values), dtype=np.int64)
+    size = n_groups * n_columns * n_columns
+    sums = {name: np.zeros(size) for name in ('n', 'x', 'xx', 'xy')}
+    cells = np.arange(n_columns * n_columns)
+
+    for start in range(0, len(values), CHUNK_ROWS):
+        chunk = values[start:start + CHUNK_ROWS]
+        present = ~np.isnan(chunk)
+        filled = np.where(present, chunk, 0.0)
+        mask = present.astype(float)
+        # Every row adds its (column x column) products to the cells of its group
+        bins = (codes[start:start + CHUNK_ROWS, None] * n_columns * n_columns + cells).ravel()
+        products = {
+            'n': mask[:, :, None] * mask[:, None, :],
+            'x': filled[:, :, None] * mask[:, None, :],
+            'xx': (filled ** 2)[:, :, None] * mask[:, None, :],
+            'xy': filled[:, :, None] * filled[:, None, :],
+        }
+        for name, product in products.items():
+            sums[name] += np.bincount(bins, weights=product.ravel(), minlength=size)
+
+    return {name: total.reshape(n_groups, n_columns, n_columns) for name, total in sums.items()}
+
+
+# Turning the pair sums into overlap counts, covariances and correlations like DataFrame.cov() and DataFrame.corr()
+# (pairs with fewer than two overlapping rows have none). The sums can be of values shifted by a constant per column
+def moment_statistics(sums):
+    n, x, xx, xy = sums['n'], sums['x'], sums['xx'], sums['xy']
+    x_t = np.swapaxes(x, -1, -2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        co_moment = xy - x * x_t / n
+        covariance = np.where(n > 1, co_moment / (n - 1), np.nan)
+        spread = xx - x ** 2 / n
+        correlation = np.where(n > 1, co_moment / np.sqrt(spread * np.swapaxes(spread, -1, -2)), np.nan)
+    return n.astype(np.int64), covariance, np.clip(correlation, -1, 1)
+
+
+# Calculating the counts, covariances and correlations of the given columns for every value of the 'by' column (all rows
+# when by is None). Returns a long table with one row per (group, column pair)
+def correlation_table(frame, columns, by=None):
+    values = frame[columns].to_numpy(dtype=float)
+    # Shifting every column by its mean keeps the sums small, the statistics do not change
+    with np.errstate(invalid='ignore'):
+        values = values - np.nan_to_num(np.nanmean(values, axis=0))
+    if by is None:
+        codes, groups = None, [None]
+    else:
+        codes, groups = pd.factorize(frame[by], sort=True)
+        values, codes = values[codes >= 0], codes[codes >= 0]
+    n, covariance, correlation = moment_statistics(moment_sums(values, codes, len(groups)))
+
+    # One row per cell of every matrix
+    group_index, row, column = np.meshgrid(np.arange(len(groups)), np.arange(len(columns)), np.arange(len(columns)),
+                                           indexing='ij')
+    table = pd.DataFrame({
+        'Variable A': np.array(columns, dtype=object)[row.ravel()],
+        'Variable B': np.array(columns, dtype=object)[column.ravel()],
+        'N': n.ravel(),
+        'Covariance': covariance.ravel(),
+        'Correlation': correlation.ravel(),
+    })
+    if by is not None:
+        table.insert(0, by, np.asarray(groups)[group_index.ravel()])
+    return table
+
+
+# Returning one matrix of a statistic ('N', 'Covariance' or 'Correlation') from a correlation table,
+# optionally of one group of a stacked table
+def correlation_matrix(table, statistic, by=None, group=None):
+    if by is not None:
+        table = table[table[by] == group]
+    matrix = table.pivot(index='Variable A', columns='Variable B', values=statistic)
+    order = list(dict.fromkeys(table['Variable A']))
+    matrix = matrix.reindex(index=order, columns=order)
+    matrix.index.name = matrix.columns.name = None
+    return matrix
+
+
+# Loading the correlation table of the pollutant concentrations for all rows, every site or every month.
+# It is calculated once per data version
+def load_correlations(by=None, policy=POC_POLICY):
+    if by not in CORRELATION_GROUPS:
+        raise ValueError(f"Unknown correlation group '{by}', expected one of {CORRELATION_GROUPS}")
+    columns = [POLLUTANTS[pollutant]['column'] for pollutant in CORRELATION_POLLUTANTS]
+
+    def build():
+        wide = load_wide(policy)
+        wide['Month'] = wide['Date'].dt.to_period('M').dt.start_time
+        return correlation_table(wide, columns, by)
+    return cached_artifact(f'correlations_{by or "all"}_{policy}', build)
@@ -0,0 +1,73 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Aggregate cube of the long store. For every location, pollutant
+# and period (day, week or month) it holds the mean, max and count of the
+# concentration and the mean and max AQI. The cube is built once per data version
+# so the pages answer widget changes with a lookup instead of a groupby over every row.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+from air_quality.loader import cached_artifact
+from air_quality.poc import POC_POLICY
+from air_quality.store import load_long, load_sites
+
+# The time grains of the cube and the pandas period used for each, days are not grouped further
+GRAINS = {'day': None, 'week': 'W', 'month': 'M'}
+
+# The cube is sorted by these columns so a (grain, pollutant, location) lookup is a binary search
+CUBE_KEYS = ['Grain', 'Pollutant', 'Local Site Name', 'Period']
+
+
+# Building the cube from the long store and the site table.
+# Sites that share a name are aggregated together, like the pages group by 'Local Site Name'
+def build_cube(long_data, sites):
+    data = long_data.assign(**{'Local Site Name': long_data['Site ID'].map(sites.set_index('Site ID')['Local Site Name'])})
+
+    parts = []
+    for grain, frequency in GRAINS.items():
+        period = data['Date'] if frequency is None else data['Date'].dt.to_period(frequency).dt.start_time
+        part = data.assign(Period=period).groupby(['Pollutant', 'Local Site Name', 'Period'], observed=True).agg(
+            Mean=('Concentration', 'mean'),
+            Max=('Concentration', 'max'),
+            Count=('Concentration', 'count'),
+            **{'AQI Mean': ('Daily AQI Value', 'mean'), 'AQI Max': ('Daily AQI Value', 'max')})
+        parts.append(part.reset_index().assign(Grain=grain))
+
+    cube = pd.concat(parts, ignore_index=True)
+    cube['Pollutant'] = cube['Pollutant'].astype(str)
+    return cube[CUBE_KEYS + ['Mean', 'Max', 'Count', 'AQI Mean', 'AQI Max']].sort_values(CUBE_KEYS, ignore_index=True)
+
+
+# Loading the cube, it is built once per data version
+def load_cube(policy=POC_POLICY):
+    return cached_artifact(f'cube_{policy}', lambda: build_cube(load_long(policy), load_sites()))
+
+
+# Class answering lookups on the cube. The cube is indexed once so every lookup is a binary search on the sorted index
+class CubeIndex:
+
+    def __init__(self, cube):
+        self.cube = cube.set_index(CUBE_KEYS[:-1]).sort_index()
+
+    # Returning the periods of one grain for a pollutant, optionally only at one location.
+    # For a single location the periods are sorted, so a range of periods starting between start and end (both included)
+    # is found with a binary search
+    def query(self, grain, pollutant, location=None, start=None, end=None):
+        key = (grain, pollutant) if location is None else (grain, pollutant, location)
+        try:
+            result = self.cube.xs(key, level=CUBE_KEYS[:len(key)], drop_level=False).reset_index()
+        except KeyError:
+            return self.cube.iloc[:0].reset_index()
+        if location is not None and (start is not None or end is not None):
+            periods = result['Period'].to_numpy()
+            low = np.searchsorted(periods, np.datetime64(pd.Timestamp(start)), side='left') if start is not None else 0
+            high = np.searchsorted(periods, np.datetime64(pd.Timestamp(end)), side='right') if end is not None else len(periods)
+            result = result.iloc[low:max(low, high)]
+        return result
@@ -0,0 +1,142 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Detection of pollution episodes such as wildfire smoke. Every
+# daily reading is compared with the median of the previous readings of its location
+# and pollutant, scaled by their median absolute deviation (a robust z-score), for all
+# series at once. Consecutive days with unusually high readings are merged into
+# episodes with their start, end, peak and affected locations. It can run as a batch
+# job over new EPA downloads.
+# Usage: python -m air_quality.events [--threshold Z] [--output FILE]
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from air_quality.loader import cached_artifact, data_version
+from air_quality.poc import POC_POLICY
+from air_quality.rolling import load_rolling
+
+# Number of previous readings of a series used as its baseline, and the fewest needed to score a reading
+BASELINE_READINGS = 30
+MIN_BASELINE_READINGS = 7
+
+# Robust z-score above which a reading is flagged (Iglewicz and Hoaglin's cut-off for outliers)
+Z_THRESHOLD = 3.5
+
+# A flagged reading must also be above this quantile of all daily readings of its pollutant, so small changes at
+# locations with very clean air are not reported as events
+LEVEL_QUANTILE = 0.9
+
+# Scale factor making the median absolute deviation comparable to a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+# A series that barely varies (e.g. readings at the instrument's resolution) is scaled by at least this share of its median
+MIN_SCALE_SHARE = 0.1
+
+# Flagged days at most this many days apart belong to the same episode
+MAX_GAP_DAYS = 1
+
+# Number of readings scored at once, limits the (readings x baseline) arrays
+CHUNK_ROWS = 100000
+
+
+# Calculating the robust z-score of every reading against the previous baseline readings of its own series.
+# series holds the series of every value, sorted by series and then date. Readings without enough previous readings get NaN
+def robust_z_scores(series, values, baseline=BASELINE_READINGS, min_baseline=MIN_BASELINE_READINGS):
+    values = np.asarray(values, dtype=float)
+    positions = np.arange(len(values))
+    # The first reading of every series, no baseline reaches before it
+    starts = np.flatnonzero(np.r_[True, series[1:] != series[:-1]]) if len(series) else np.array([], dtype=int)
+    series_start = np.repeat(starts, np.diff(np.r_[starts, len(series)]))
+
+    z_scores = np.full(len(values), np.nan)
+    for start in range(0, len(values), CHUNK_ROWS):
+        rows = positions[start:start + CHUNK_ROWS]
+        # Row i's baseline holds the readings i - 1 down to i - baseline of its series
+        window = rows[:, None] - 1 - np.arange(baseline)
+        window_values = np.where(window >= series_start[rows, None], values[np.maximum(window, 0)], np.nan)
+        counts = (~np.isnan(window_values)).sum(axis=1)
+        scored = counts >= min_baseline
+        if not scored.any():
+            continue
+        median = np.nanmedian(window_values[scored], axis=1)
+        mad = np.nanmedian(np.abs(window_values[scored] - median[:, None]), axis=1)
+        scale = np.maximum(MAD_SCALE * mad, MIN_SCALE_SHARE * np.abs(median))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_scores[rows[scored]] = np.where(scale > 0, (values[rows[scored]] - median) / scale, np.nan)
+    return z_scores
+
+
+# Scoring the daily mean of every location and pollutant of the rolling table ('air_quality/rolling.py', sorted by
+# pollutant, location and date). Returns the readings with their robust z-score and whether they are flagged
+def score_readings(daily, threshold=Z_THRESHOLD, level_quantile=LEVEL_QUANTILE):
+    series = pd.factorize(pd.MultiIndex.from_frame(daily[['Pollutant', 'Local Site Name']]))[0]
+    scored = daily[['Pollutant', 'Local Site Name', 'Date', 'Mean']].copy()
+    scored['Z-Score'] = robust_z_scores(series, scored['Mean'].to_numpy())
+    # Only unusually high readings that are also high for the pollutant are pollution events
+    level = scored.groupby('Pollutant')['Mean'].transform('quantile', level_quantile)
+    scored['Flagged'] = (scored['Z-Score'] >= threshold) & (scored['Mean'] > level)
+    return scored
+
+
+# Merging the flagged readings of every pollutant into episodes. Flagged days of any location that are at most
+# max_gap days apart are one episode. Returns one row per episode with its dates, peak and affected locations
+def find_episodes(scored, max_gap=MAX_GAP_DAYS):
+    flagged = scored[scored['Flagged']].sort_values(['Pollutant', 'Date'], ignore_index=True)
+    columns = ['Pollutant', 'Start', 'End', 'Days', 'Peak Date', 'Peak Location', 'Peak Value', 'Peak Z-Score',
+               'Number of Locations', 'Locations']
+    if flagged.empty:
+        return pd.DataFrame(columns=columns)
+
+    # A new episode starts at a new pollutant or after a gap of more than max_gap days
+    days = flagged['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    pollutants = flagged['Pollutant'].to_numpy()
+    new_episode = np.r_[True, (pollutants[1:] != pollutants[:-1]) | (np.diff(days) > max_gap)]
+    flagged['Episode'] = np.cumsum(new_episode)
+
+    grouped = flagged.groupby('Episode')
+    peaks = flagged.loc[grouped['Z-Score'].idxmax()].set_index('Episode')
+    episodes = pd.DataFrame({
+        'Pollutant': grouped['Pollutant'].first(),
+        'Start': grouped['Date'].min(),
+        'End': grouped['Date'].max(),
+        'Peak Date': peaks['Date'],
+        'Peak Location': peaks['Local Site Name'],
+        'Peak Value': peaks['Mean'],
+        'Peak Z-Score': peaks['Z-Score'],
+        'Number of Locations': grouped['Local Site Name'].nunique(),
+        'Locations': grouped['Local Site Name'].agg(lambda sites: ', '.join(sorted(set(sites)))),
+    })
+    episodes['Days'] = (episodes['End'] - episodes['Start']).dt.days + 1
+    return episodes[columns].sort_values(['Start', 'Pollutant'], ignore_index=True)
+
+
+# Detecting the episodes of the current data
+def detect_episodes(threshold=Z_THRESHOLD, max_gap=MAX_GAP_DAYS, policy=POC_POLICY):
+    return find_episodes(score_readings(load_rolling(policy), threshold), max_gap)
+
+
+# Loading the episodes with the default settings, they are detected once per data version
+def load_episodes(policy=POC_POLICY):
+    return cached_artifact(f'episodes_{policy}', lambda: detect_episodes(policy=policy))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detect pollution episodes in the EPA files')
+    parser.add_argument('--threshold', type=float, default=Z_THRESHOLD, help='robust z-score of a flagged reading')
+    parser.add_argument('--max-gap', type=int, default=MAX_GAP_DAYS, help='largest gap in days within an episode')
+    parser.add_argument('--output', help='csv file to write the episodes to')
+    arguments = parser.parse_args()
+
+    episodes = detect_episodes(arguments.threshold, arguments.max_gap)
+    if arguments.output:
+        episodes.to_csv(arguments.output, index=False)
+    print(f'{len(episodes)} episodes found in data version {data_version()}')
+    print(episodes.drop(columns='Locations').to_string(index=False))
@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Cache of rendered matplotlib/seaborn figures. A figure is
+# keyed on a hash of its input data, the drawing function and its parameters, and
+# kept as PNG (or SVG) bytes. Repeat views are served from the cache without going
+# through matplotlib. The cache is shared by all sessions of the app and the least
+# recently used figures are evicted once it grows past its size cap.
+# Libraries needed: matplotlib, numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Largest total size of the cached figures, can be changed with an environment variable (in megabytes)
+FIGURE_CACHE_BYTES = int(float(os.environ.get('AIR_QUALITY_FIGURE_CACHE_MB', 64)) * 2 ** 20)
+
+# Formats a figure can be rendered to, both can be shown with st.image
+FIGURE_FORMATS = ('png', 'svg')
+
+# Resolution of the rendered figures, the same as st.pyplot
+FIGURE_DPI = 200
+
+
+# Feeding a value into a hash. Frames and series are hashed by their content (values, index and labels),
+# arrays by their bytes, dtype and shape, and anything else by its repr
+def _update_hash(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = (list(value.columns), list(value.dtypes.astype(str))) if value.ndim == 2 else (value.name, str(value.dtype))
+        digest.update(repr((type(value).__name__, value.shape, value.index.names, labels)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}[{len(value)}]'.encode())
+        for item in value:
+            _update_hash(digest, item)
+    elif isinstance(value, dict):
+        _update_hash(digest, sorted(value.items(), key=lambda item: repr(item[0])))
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b'|')
+
+
+# Returning a hash of any number of values (frames, series, arrays and plain values)
+def data_hash(*values):
+    digest = hashlib.sha1()
+    for value in values:
+        _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+# Least recently used cache of rendered figures with a cap on the total size of the stored bytes.
+# It is shared by the Streamlit sessions, which run in threads, so every access holds a lock
+class FigureCache:
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._figures)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._figures
+
+    # Returning the bytes of a figure (None when it is not cached) and marking it as the most recently used
+    def get(self, key):
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is None:
+                self.misses += 1
+                return None
+            self._figures.move_to_end(key)
+            self.hits += 1
+            return figure
+
+    # Storing the bytes of a figure and evicting the least recently used figures until the cache fits its cap.
+    # A figure larger than the whole cache is not stored
+    def put(self, key, figure):
+        if len(figure) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._figures:
+                self.nbytes -= len(self._figures.pop(key))
+            self._figures[key] = figure
+            self.nbytes += len(figure)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._figures.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.nbytes = 0
+
+
+# The cache used by the pages
+FIGURE_CACHE = FigureCache()
+
+
+# Rendering a figure to bytes through the cache. draw(*data, **params) must return a new matplotlib figure, it is only
+# called when the figure is not cached. The key covers the data, the parameters, the format and the drawing function's
+# code, so editing the function while the app runs does not serve the old figure
+def render_figure(draw, *data, format='png', dpi=FIGURE_DPI, cache=FIGURE_CACHE, **params):
+    if format not in FIGURE_FORMATS:
+        raise ValueError(f"Unknown figure format '{format}', expected one of {FIGURE_FORMATS}")
+    code = draw.__code__
+    key = data_hash(draw.__module__, draw.__qualname__, code.co_code, code.co_consts, format, dpi, params, *data)
+    figure = cache.get(key)
+    if figure is not None:
+        return figure
+
+    fig = draw(*data, **params)
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=format, dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    figure = buffer.getvalue()
+    cache.put(key, figure)
+    return figure
@@ -0,0 +1,268 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Shared loader for the seven EPA csv files and the combined
+# dataset. Every file is parsed by the multithreaded Arrow csv reader with explicit
+# types and only the columns we use, several files at once on a thread pool, and
+# the parsed result is kept as a Parquet file in a local cache directory so later
+# page loads decode a binary file instead of tokenizing csv text again.
+# Libraries needed: pandas, pyarrow
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# The data files live in the project's root folder next to 'Homepage.py'
+DATA_DIR = Path(__file__).resolve().parent.parent
+
+# Parsed files are cached here. The location can be changed with an environment variable
+# for deployments where the project folder is read only
+CACHE_DIR = Path(os.environ.get('AIR_QUALITY_CACHE_DIR', DATA_DIR / '.cache'))
+
+# Bumping this invalidates every cached file, it must change whenever the columns or dtypes below change
+CACHE_FORMAT_VERSION = 2
+
+# Format of the dates in the EPA files, dates are parsed once when a file is read
+DATE_FORMAT = '%m/%d/%Y'
+
+# Name of the generated file holding all pollutants
+COMBINED_FILE = 'pollution_data_2023_all.csv'
+
+# Every pollutant we track: the raw file, the concentration column and the suffix used when merging.
+# The order is the order the files are merged in, PM2.5 is the base table of the left merge
+POLLUTANTS = {
+    'PM2.5': {'file': '2023_PM25.csv', 'column': 'Daily Mean PM2.5 Concentration', 'suffix': ''},
+    'Ozone': {'file': '2023_Ozone.csv', 'column': 'Daily Max 8-hour Ozone Concentration', 'suffix': '_ozone'},
+    'SO2': {'file': '2023_SO2.csv', 'column': 'Daily Max 1-hour SO2 Concentration', 'suffix': '_so2'},
+    'NO2': {'file': '2023_NO2.csv', 'column': 'Daily Max 1-hour NO2 Concentration', 'suffix': '_no2'},
+    'CO': {'file': '2023_CO.csv', 'column': 'Daily Max 8-hour CO Concentration', 'suffix': '_co'},
+    'PM10': {'file': '2023_PM10.csv', 'column': 'Daily Mean PM10 Concentration', 'suffix': '_pm10'},
+    'Pb': {'file': '2023_Pb.csv', 'column': 'Daily Mean Pb Concentration', 'suffix': '_pb'},
+}
+
+# Mapping of the pollutant's name to its concentration column
+POLLUTANT_COLUMNS = {name: spec['column'] for name, spec in POLLUTANTS.items()}
+
+# Types of the columns shared by all raw files, the 'Date' column is read as text and then parsed with DATE_FORMAT.
+# The Pb file uses '.' for a missing AQI value so the AQI is read as a nullable integer
+RAW_DTYPES = {
+    'Date': 'object',
+    'Site ID': 'int64',
+    'POC': 'int64',
+    'Local Site Name': 'object',
+    'AQS Parameter Description': 'object',
+    'Units': 'object',
+    'Daily AQI Value': 'Int64',
+}
+
+# Only the CO file contributes coordinates to the combined dataset
+COORDINATE_DTYPES = {'Site Latitude': 'float64', 'Site Longitude': 'float64'}
+
+# Columns describing a monitoring site, read from every raw file to build the site table
+SITE_DTYPES = {'Site ID': 'int64', 'Local Site Name': 'object', **COORDINATE_DTYPES}
+
+# Values the EPA files use for missing entries
+NA_VALUES = ['.', '']
+
+# Arrow types used to parse the columns of every pandas dtype above, the 'Date' column is parsed as a timestamp
+ARROW_TYPES = {'object': pa.string(), 'int64': pa.int64(), 'Int64': pa.int64(), 'float64': pa.float64()}
+
+# Number of files parsed at the same time, every file is also split between Arrow's own threads.
+# Can be changed with an environment variable (1 reads the files one after another)
+INGEST_THREADS = int(os.environ.get('AIR_QUALITY_INGEST_THREADS', min(len(POLLUTANTS), os.cpu_count() or 1)))
+
+
+# Returning the dtypes (and therefore the usecols) used to read a pollutant's raw file.
+# The POC (instrument number) is needed to collapse several instruments at the same site, see 'air_quality/poc.py'
+def raw_dtypes(pollutant):
+    dtypes = {'Date': RAW_DTYPES['Date'], 'Site ID': RAW_DTYPES['Site ID'], 'POC': RAW_DTYPES['POC'],
+              'Local Site Name': RAW_DTYPES['Local Site Name']}
+    if pollutant == 'CO':
+        dtypes.update(COORDINATE_DTYPES)
+    dtypes['AQS Parameter Description'] = RAW_DTYPES['AQS Parameter Description']
+    dtypes[POLLUTANTS[pollutant]['column']] = 'float64'
+    dtypes['Units'] = RAW_DTYPES['Units']
+    dtypes['Daily AQI Value'] = RAW_DTYPES['Daily AQI Value']
+    return dtypes
+
+
+# Returning the dtypes of the combined dataset, built from the same suffixes used in the merge.
+# The POC is dropped before merging
+def combined_dtypes():
+    dtypes = {'Date': 'object', 'Site ID': 'int64'}
+    for pollutant, spec in POLLUTANTS.items():
+        for column, dtype in raw_dtypes(pollutant).items():
+            if column not in ('Date', 'Site ID', 'POC'):
+                dtypes[column + spec['suffix'] if column in RAW_DTYPES else column] = dtype
+    return dtypes
+
+
+# ------------------------------------    File fingerprints    ------------------------------------
+
+# Content hashes are remembered per (path, size, mtime) so an unchanged file is only hashed once per process
+_hash_memo = {}
+# Parsed frames kept in memory, keyed on the file's fingerprint
+_frame_memo = {}
+_lock = threading.Lock()
+
+
+# Hashing a file's content in blocks to avoid reading it into memory at once
+def _content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Returning the (size, mtime, content hash) fingerprint of a file
+def fingerprint(path):
+    path = Path(path)
+    stat = path.stat()
+    stat_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        content = _hash_memo.get(stat_key)
+    if content is None:
+        content = _content_hash(path)
+        with _lock:
+            _hash_memo[stat_key] = content
+    return stat.st_size, stat.st_mtime_ns, content
+
+
+# ------------------------------------    Parsing    ------------------------------------
+
+# Parsing the given columns of a csv file with the Arrow csv reader. Only the columns in dtypes are converted
+# (the others are skipped while parsing), dates are parsed with DATE_FORMAT, and the frame gets the pandas dtypes above.
+# With use_threads the file is split into blocks parsed on several threads
+def parse_csv(path, dtypes, use_threads=True):
+    column_types = {column: ARROW_TYPES[dtype] for column, dtype in dtypes.items()}
+    if 'Date' in dtypes:
+        column_types['Date'] = pa.timestamp('us')
+    convert_options = pacsv.ConvertOptions(include_columns=list(dtypes), column_types=column_types, null_values=NA_VALUES,
+                                           strings_can_be_null=True, timestamp_parsers=[DATE_FORMAT])
+    table = pacsv.read_csv(path, read_options=pacsv.ReadOptions(use_threads=use_threads), convert_options=convert_options)
+    # Every column's Arrow buffers are released as soon as it is converted, so the file is not held twice in memory.
+    # Integer columns with missing values come out of Arrow as floats
+    numeric = {column: dtype for column, dtype in dtypes.items() if column != 'Date' and dtype in ('int64', 'Int64', 'float64')}
+    return table.to_pandas(split_blocks=True, self_destruct=True).astype(numeric)
+
+
+# ------------------------------------    Cached reading    ------------------------------------
+
+# Reading a csv file through the cache.
+# The in-process memo is checked first, then the Parquet cache, and only then the csv is parsed
+def _read_cached(path, dtypes):
+    path = Path(path)
+    size, mtime, content = fingerprint(path)
+    key_source = f'{CACHE_FORMAT_VERSION}|{path.name}|{size}|{mtime}|{content}|{sorted(dtypes.items())}'
+    key = hashlib.sha1(key_source.encode()).hexdigest()[:16]
+
+    with _lock:
+        frame = _frame_memo.get(key)
+    if frame is not None:
+        return frame.copy()
+
+    # The same file can be read with different columns, every column set gets its own cached file
+    prefix = f'{path.stem}-' + hashlib.sha1('|'.join(dtypes).encode()).hexdigest()[:8]
+    cache_file = CACHE_DIR / f'{prefix}-{key}.parquet'
+    if cache_file.exists():
+        frame = pd.read_parquet(cache_file)
+    else:
+        # Keeping the columns in the order they were requested
+        frame = parse_csv(path, dtypes)[list(dtypes)]
+        _write_cache(frame, cache_file, prefix)
+
+    with _lock:
+        _frame_memo[key] = frame
+    return frame.copy()
+
+
+# Writing a parsed frame to the cache and removing older cached versions of the same file.
+# Failing to write the cache (e.g. a read only folder) is not an error, the data is simply parsed again next time
+def _write_cache(frame, cache_file, prefix):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+        frame.to_parquet(temp_file, index=False)
+        os.replace(temp_file, cache_file)
+        for old_file in CACHE_DIR.glob(f'{prefix}-*.parquet'):
+            if old_file != cache_file:
+                old_file.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+# Loading the raw file of a single pollutant with only the columns needed for merging
+def load_pollutant(pollutant):
+    return _read_cached(DATA_DIR / POLLUTANTS[pollutant]['file'], raw_dtypes(pollutant))
+
+
+# Loading the site columns (name and coordinates) of a single pollutant's raw file
+def load_site_columns(pollutant):
+    return _read_cached(DATA_DIR / POLLUTANTS[pollutant]['file'], SITE_DTYPES)
+
+
+# Loading the files of several pollutants at once on a thread pool, returning a frame per pollutant.
+# load is the function loading one pollutant (load_pollutant or load_site_columns).
+# Arrow parses without holding the GIL, so the files are really parsed in parallel
+def load_pollutants(load=None, pollutants=None, threads=INGEST_THREADS):
+    load = load or load_pollutant
+    pollutants = list(pollutants or POLLUTANTS)
+    if threads <= 1:
+        return {pollutant: load(pollutant) for pollutant in pollutants}
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return dict(zip(pollutants, pool.map(load, pollutants)))
+
+
+# Loading the combined dataset of all pollutants.
+# The build step only merges the raw files again when one of them has changed
+def load_combined():
+    from air_quality.build import build_combined
+    build_combined()
+    return _read_cached(DATA_DIR / COMBINED_FILE, combined_dtypes())
+
+
+# Loading the first rows of a raw file with all its columns to show what the EPA data looks like
+def load_raw_sample(pollutant, n_rows=50):
+    return pd.read_csv(DATA_DIR / POLLUTANTS[pollutant]['file'], nrows=n_rows)
+
+
+# ------------------------------------    Derived datasets    ------------------------------------
+
+# Returning a short hash identifying the current content of all raw files.
+# Anything computed from the raw files is cached under this version and recomputed when it changes
+def data_version():
+    hashes = [fingerprint(DATA_DIR / spec['file'])[2] for spec in POLLUTANTS.values()]
+    return hashlib.sha1(f'{CACHE_FORMAT_VERSION}|{"|".join(hashes)}'.encode()).hexdigest()[:16]
+
+
+# Returning a frame derived from the raw files, computing it with build() only when the data version
+# has no cached copy yet. The result is kept in memory and as a Parquet file named after the data version
+def cached_artifact(name, build):
+    version = data_version()
+    key = f'{name}-{version}'
+    with _lock:
+        frame = _frame_memo.get(key)
+    if frame is not None:
+        return frame.copy()
+
+    cache_file = CACHE_DIR / f'{key}.parquet'
+    if cache_file.exists():
+        frame = pd.read_parquet(cache_file)
+    else:
+        frame = build()
+        _write_cache(frame, cache_file, name)
+
+    with _lock:
+        _frame_memo[key] = frame
+    return frame.copy()
@@ -0,0 +1,51 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Summaries of missing data. The presence of every value is packed
+# into bitmaps (one bit per row and column), with every group of rows starting on a
+# byte boundary, so the number of available values per group is a byte-wise bit count.
+# The result is a small (group x column) matrix of coverage fractions that can be
+# plotted instead of one heatmap column per row.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every possible byte value
+_BITS_PER_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+# Packing the presence of values into bitmaps, one group of rows after the other.
+# codes holds the group of every row, sorted groups are laid out consecutively and padded to whole bytes.
+# Returns the bitmaps (bytes x columns), the first byte of every group and the number of rows of every group
+def group_bitmaps(present, codes, n_groups):
+    order = np.argsort(codes, kind='stable')
+    sizes = np.bincount(codes, minlength=n_groups)
+    padded_sizes = (sizes + 7) // 8 * 8
+    padded_starts = np.concatenate([[0], np.cumsum(padded_sizes)[:-1]])
+    row_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # Position of every sorted row in the padded layout
+    sorted_codes = codes[order]
+    positions = padded_starts[sorted_codes] + np.arange(len(codes)) - row_starts[sorted_codes]
+    padded = np.zeros((padded_sizes.sum(), present.shape[1]), dtype=bool)
+    padded[positions] = present[order]
+
+    return np.packbits(padded, axis=0), padded_starts // 8, sizes
+
+
+# Calculating the fraction of available values of every column for every value of the 'by' column.
+# Returns a frame with one row per group (sorted) and one column per requested column
+def coverage(frame, columns, by):
+    codes, groups = pd.factorize(frame[by], sort=True)
+    keep = codes >= 0
+    present = frame.loc[keep, columns].notna().to_numpy()
+    bitmaps, byte_starts, sizes = group_bitmaps(present, codes[keep], len(groups))
+
+    # Counting the available values of every group from its bytes
+    counts = np.add.reduceat(_BITS_PER_BYTE[bitmaps], byte_starts, axis=0)
+    return pd.DataFrame(counts / sizes[:, None], index=pd.Index(groups, name=by), columns=columns)
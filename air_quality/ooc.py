@@ -0,0 +1,318 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Out-of-core engine for EPA daily extracts that do not fit in
+# memory (e.g. many years of national data). The csv files are streamed in blocks
+# into a Parquet dataset partitioned by pollutant and year, and the merge and the
+# averages, AQI contingency table and covariance/correlation of the pages are
+# computed one year at a time. Only the needed columns are read and the state,
+# year, site and pollutant filters are applied while scanning, so memory is bounded
+# by the partitions of one year (all pollutants of that year) instead of the whole
+# extract. The other sections of the pages still use the 2023 files in memory.
+# Usage: python -m air_quality.ooc convert FILE [FILE ...]
+#        python -m air_quality.ooc merge OUTPUT_DIR
+# Libraries needed: numpy, pandas, pyarrow
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import csv
+import hashlib
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+from air_quality.aggregates import OnlineAggregates
+from air_quality.aqi import AQI_BREAKPOINTS, AQI_CATEGORIES, categorize_aqi, concentration_aqi
+from air_quality.correlation import moment_statistics, moment_sums
+from air_quality.loader import DATA_DIR, DATE_FORMAT, NA_VALUES, POLLUTANTS
+from air_quality.poc import POC_POLICY, SITE_DAY, collapse_poc
+from air_quality.store import wide_view
+
+# The engine used by the pages: 'memory' reads the 2023 files into memory, 'ooc' uses the partitioned dataset below
+ENGINE = os.environ.get('AIR_QUALITY_ENGINE', 'memory')
+
+# Folder of the partitioned dataset, it can be changed with an environment variable. The dataset is converted from
+# files that may no longer be around, so it is kept next to the data and not in the cache folder, which can be deleted
+DATASET_DIR = Path(os.environ.get('AIR_QUALITY_DATASET_DIR', DATA_DIR / 'dataset'))
+
+# Size of the csv blocks streamed into the dataset, only a few blocks are held in memory at a time
+BLOCK_SIZE = 16 << 20
+
+# Columns of every row of the dataset. 'Pollutant' and 'Year' are the partition folders (Pollutant=PM2.5/Year=2023)
+DATASET_SCHEMA = pa.schema([
+    ('Date', pa.date32()),
+    ('Site ID', pa.int64()),
+    ('POC', pa.int64()),
+    ('Local Site Name', pa.string()),
+    ('State', pa.string()),
+    ('Concentration', pa.float64()),
+    ('Daily AQI Value', pa.float64()),
+    ('Pollutant', pa.string()),
+    ('Year', pa.int16()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('Pollutant', pa.string()), ('Year', pa.int16())]), flavor='hive')
+
+
+# Reading a comma separated list from an environment variable, year ranges can be written as 2000-2024
+def _env_list(name, convert=str):
+    values = []
+    for item in filter(None, (item.strip() for item in os.environ.get(name, '').split(','))):
+        if convert is int and '-' in item:
+            first, last = item.split('-')
+            values.extend(range(int(first), int(last) + 1))
+        else:
+            values.append(convert(item))
+    return values or None
+
+
+# Filters applied by the pages when they use this engine, e.g. AIR_QUALITY_STATES=Michigan,Ohio AIR_QUALITY_YEARS=2000-2024
+SCAN_FILTERS = {'states': _env_list('AIR_QUALITY_STATES'), 'years': _env_list('AIR_QUALITY_YEARS', int)}
+
+
+# ------------------------------------    Converting the csv files    ------------------------------------
+
+# Finding the pollutant of an EPA daily file from its concentration column
+def detect_pollutant(path):
+    with open(path, newline='') as file:
+        header = next(csv.reader(file))
+    for pollutant, spec in POLLUTANTS.items():
+        if spec['column'] in header:
+            return pollutant
+    raise ValueError(f"'{path}' has none of the concentration columns of {list(POLLUTANTS)}")
+
+
+# Streaming a csv file in blocks, reading only the columns of the dataset.
+# Readings without a concentration are dropped, like in the long store
+def _csv_batches(path, pollutant, block_size=BLOCK_SIZE):
+    column = POLLUTANTS[pollutant]['column']
+    column_types = {'Date': pa.timestamp('s'), 'Site ID': pa.int64(), 'POC': pa.int64(), 'Local Site Name': pa.string(),
+                    'State': pa.string(), column: pa.float64(), 'Daily AQI Value': pa.float64()}
+    convert_options = pacsv.ConvertOptions(include_columns=list(column_types), include_missing_columns=True,
+                                           column_types=column_types, null_values=NA_VALUES, strings_can_be_null=True,
+                                           timestamp_parsers=[DATE_FORMAT])
+    with pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=block_size),
+                        convert_options=convert_options) as reader:
+        for batch in reader:
+            batch = batch.filter(pc.is_valid(batch[column]))
+            dates = pc.cast(batch['Date'], pa.date32())
+            yield pa.RecordBatch.from_arrays([
+                dates, batch['Site ID'], batch['POC'], batch['Local Site Name'], batch['State'], batch[column],
+                batch['Daily AQI Value'], pa.repeat(pollutant, batch.num_rows), pc.cast(pc.year(dates), pa.int16()),
+            ], schema=DATASET_SCHEMA)
+
+
+# Converting EPA daily csv files into the partitioned dataset, one file at a time.
+# The files of every csv are named after it, so converting a file again replaces its earlier version
+def convert_csv(paths, dataset_dir=DATASET_DIR, block_size=BLOCK_SIZE):
+    dataset_dir = Path(dataset_dir)
+    for path in map(Path, paths):
+        for old_file in dataset_dir.glob(f'**/{path.stem}-*.parquet'):
+            old_file.unlink()
+        ds.write_dataset(_csv_batches(path, detect_pollutant(path), block_size), dataset_dir, schema=DATASET_SCHEMA,
+                         format='parquet', partitioning=PARTITIONING, basename_template=f'{path.stem}-{{i}}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+
+
+# ------------------------------------    Scanning the dataset    ------------------------------------
+
+# Opening the partitioned dataset, nothing is read until it is scanned
+def open_dataset(dataset_dir=DATASET_DIR):
+    return ds.dataset(dataset_dir, format='parquet', partitioning=PARTITIONING)
+
+
+# Building the scan filter. Pollutant and year filters skip whole partitions, state and site filters are applied
+# to the Parquet row groups while they are read. A filter left as None keeps everything
+def scan_filter(states=None, years=None, sites=None, pollutants=None):
+    expression = None
+    for column, values in (('State', states), ('Year', years), ('Site ID', sites), ('Pollutant', pollutants)):
+        if values is not None:
+            condition = ds.field(column).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+# Returning the (pollutant, year) partitions matching a filter, by year and then in the order of POLLUTANTS
+def partition_keys(dataset, expression=None):
+    keys = set()
+    for fragment in dataset.get_fragments(filter=expression):
+        values = ds.get_partition_keys(fragment.partition_expression)
+        keys.add((values['Pollutant'], values['Year']))
+    order = list(POLLUTANTS)
+    return sorted(keys, key=lambda key: (key[1], order.index(key[0]) if key[0] in order else len(order)))
+
+
+# Reading the rows of one partition collapsed to one reading per site-day, with only the columns the engine uses
+def read_partition(dataset, pollutant, year, expression=None, policy=POC_POLICY):
+    condition = (ds.field('Pollutant') == pollutant) & (ds.field('Year') == year)
+    if expression is not None:
+        condition = condition & expression
+    columns = ['Date', 'Site ID', 'POC', 'Local Site Name', 'Concentration', 'Daily AQI Value']
+    frame = dataset.to_table(columns=columns, filter=condition).to_pandas(date_as_object=False)
+    frame['Date'] = frame['Date'].astype('datetime64[ns]')
+
+    # The POC policies work on the pollutant's own concentration column
+    column = POLLUTANTS[pollutant]['column']
+    frame = collapse_poc(frame.rename(columns={'Concentration': column}), pollutant, policy)
+    frame = frame.rename(columns={column: 'Concentration'})
+    frame.insert(2, 'Pollutant', pollutant)
+    return frame
+
+
+# Returning a short hash of the dataset's files, results computed from the dataset are kept per version
+def dataset_version(dataset_dir=DATASET_DIR):
+    digest = hashlib.sha1()
+    for path in sorted(Path(dataset_dir).glob('**/*.parquet')):
+        stat = path.stat()
+        digest.update(f'{path}|{stat.st_size}|{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:16]
+
+
+# Results of the computations below, keyed on the dataset version and the arguments
+_result_memo = {}
+_lock = threading.Lock()
+
+
+# Returning a memoized result, computing it only for a new dataset version or new arguments
+def _memoized(name, dataset_dir, arguments, compute):
+    key = (name, dataset_version(dataset_dir), repr(arguments))
+    with _lock:
+        if key in _result_memo:
+            return _result_memo[key]
+    result = compute()
+    with _lock:
+        _result_memo[key] = result
+    return result
+
+
+# Returning the first name of every site seen in a list of partitions, sites without a name are named by their ID
+def _site_names(frames):
+    sites = pd.concat([frame[['Site ID', 'Local Site Name']] for frame in frames], ignore_index=True)
+    sites = sites.groupby('Site ID').first()
+    sites['Local Site Name'] = sites['Local Site Name'].fillna(sites.index.to_series().astype(str))
+    return sites.reset_index()
+
+
+# Reading the partitions of every year, calling handle(year, frames) with the collapsed frames of that year.
+# Only one year is held in memory at a time. Returns the site table of all rows read
+def _scan_years(dataset_dir, expression, policy, handle, pollutants=None):
+    dataset = open_dataset(dataset_dir)
+    keys = [key for key in partition_keys(dataset, expression) if pollutants is None or key[0] in pollutants]
+    sites = pd.DataFrame({'Site ID': pd.Series(dtype='int64'), 'Local Site Name': pd.Series(dtype='object')})
+    for year in sorted({year for _, year in keys}):
+        frames = [read_partition(dataset, pollutant, year, expression, policy) for pollutant, key_year in keys
+                  if key_year == year]
+        handle(year, frames)
+        sites = _site_names([sites] + frames)
+    return sites
+
+
+# ------------------------------------    Computations of the pages    ------------------------------------
+
+# Calculating the count, mean, variance and max of every site and pollutant with the running aggregates of
+# 'air_quality/aggregates.py', merging one year at a time. Returns the aggregates and the site table
+def site_aggregates(dataset_dir=DATASET_DIR, policy=POC_POLICY, **filters):
+    def compute():
+        aggregates = OnlineAggregates()
+        sites = _scan_years(dataset_dir, scan_filter(**filters), policy,
+                            lambda year, frames: [aggregates.update(frame) for frame in frames])
+        return aggregates, sites
+    return _memoized('site_aggregates', dataset_dir, (policy, filters), compute)
+
+
+# Counting the days of every AQI category at every site. The AQI is calculated from the concentration of one pollutant,
+# or of all pollutants with an AQI when pollutant is None, where a day's AQI is the highest AQI of its pollutants.
+# Returns a (site name x category) table with every category as a column
+def aqi_crosstab(pollutant=None, dataset_dir=DATASET_DIR, policy=POC_POLICY, **filters):
+    def compute():
+        counts = []
+
+        def handle(year, frames):
+            readings = pd.concat(frames, ignore_index=True)
+            readings['AQI'] = concentration_aqi(readings['Concentration'], readings['Pollutant'])
+            daily = readings.groupby(SITE_DAY)['AQI'].max().reset_index()
+            daily['Category'] = categorize_aqi(daily['AQI'])
+            counts.append(pd.crosstab(daily['Site ID'], daily['Category'], dropna=False))
+
+        pollutants = list(AQI_BREAKPOINTS) if pollutant is None else [pollutant]
+        sites = _scan_years(dataset_dir, scan_filter(**filters), policy, handle, pollutants)
+        table = pd.concat(counts).groupby(level=0).sum() if counts else pd.DataFrame(columns=AQI_CATEGORIES)
+        table = table.reindex(columns=AQI_CATEGORIES, fill_value=0)
+        table.index = table.index.map(sites.set_index('Site ID')['Local Site Name'])
+        table = table.groupby(level=0).sum()
+        table.index.name = 'Local Site Name'
+        table.columns.name = 'AQI_Category'
+        return table
+    return _memoized('aqi_crosstab', dataset_dir, (pollutant, policy, filters), compute)
+
+
+# Calculating the overlap counts, covariance and correlation matrices of the concentrations like DataFrame.cov() and
+# DataFrame.corr(), using every site-day where both pollutants of a pair were measured. The sums of every pair
+# ('air_quality/correlation.py') are accumulated one year at a time, on values shifted by the first year's means to keep
+# the sums small. Returns (covariance, correlation, counts) frames with the concentration columns as rows and columns
+def moment_matrices(pollutants=None, dataset_dir=DATASET_DIR, policy=POC_POLICY, **filters):
+    def compute():
+        names = list(pollutants or POLLUTANTS)
+        sums = {}
+        shift = {}
+
+        def handle(year, frames):
+            readings = pd.concat(frames, ignore_index=True)
+            wide = readings.pivot_table(index=SITE_DAY, columns='Pollutant', values='Concentration', aggfunc='mean')
+            wide = wide.reindex(columns=names)
+            if not shift:
+                shift.update(wide.mean().fillna(0))
+            values = wide.to_numpy(dtype=float) - np.array([shift[name] for name in names])
+            for name, total in moment_sums(values).items():
+                sums[name] = sums.get(name, 0) + total
+
+        _scan_years(dataset_dir, scan_filter(**filters), policy, handle, names)
+        if not sums:
+            sums.update(moment_sums(np.empty((0, len(names)))))
+        counts, covariance, correlation = (statistic[0] for statistic in moment_statistics(sums))
+        columns = [POLLUTANTS[name]['column'] for name in names]
+        return tuple(pd.DataFrame(statistic, index=columns, columns=columns)
+                     for statistic in (covariance, correlation, counts))
+    return _memoized('moment_matrices', dataset_dir, (pollutants, policy, filters), compute)
+
+
+# Writing the merged (wide) dataset with one Parquet file per year, in the columns of the combined dataset.
+# Like the merge of 'air_quality/build.py', PM2.5 is the base table: only site-days with a PM2.5 row are kept and the
+# other pollutants are left merged on them
+def merge_dataset(output_dir, dataset_dir=DATASET_DIR, policy=POC_POLICY, **filters):
+    output_dir = Path(output_dir)
+
+    def handle(year, frames):
+        long_data = pd.concat(frames, ignore_index=True)
+        sites = _site_names(frames)
+        site_days = long_data.loc[long_data['Pollutant'] == 'PM2.5', SITE_DAY].drop_duplicates()
+        wide = site_days.merge(wide_view(long_data, sites).drop(columns='Local Site Name'), on=SITE_DAY, how='left')
+        wide.insert(2, 'Local Site Name', wide['Site ID'].map(sites.set_index('Site ID')['Local Site Name']))
+        year_dir = output_dir / f'Year={year}'
+        year_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = year_dir / f'part.{os.getpid()}.tmp'
+        wide.to_parquet(temp_file, index=False)
+        os.replace(temp_file, year_dir / 'part.parquet')
+
+    _scan_years(dataset_dir, scan_filter(**filters), policy, handle)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'convert':
+        convert_csv(sys.argv[2:])
+        print(f'Converted {len(sys.argv) - 2} file(s) into {DATASET_DIR}')
+    elif len(sys.argv) == 3 and sys.argv[1] == 'merge':
+        merge_dataset(sys.argv[2], **SCAN_FILTERS)
+        print(f'Merged {DATASET_DIR} into {sys.argv[2]}')
+    else:
+        print('Usage: python -m air_quality.ooc convert FILE [FILE ...] | merge OUTPUT_DIR')
+        sys.exit(1)
@@ -0,0 +1,48 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Data partitioned by site and sorted by date. The rows of every
+# site are stored next to each other in date order, so the rows of a site are found
+# with a dictionary lookup and a date range within a site with a binary search,
+# instead of comparing every row of the dataset.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+
+# Class holding a frame sorted by (site, date) with the first and last row of every site
+class SitePartitions:
+
+    def __init__(self, frame, site_column='Local Site Name'):
+        self.site_column = site_column
+        self.frame = frame.sort_values([site_column, 'Date'], kind='stable', ignore_index=True)
+        self.dates = self.frame['Date'].to_numpy()
+
+        # The rows of every site are between its first row and the first row of the next site
+        sites = self.frame[site_column].to_numpy()
+        starts = np.flatnonzero(np.r_[True, sites[1:] != sites[:-1]]) if len(sites) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(sites)]
+        self.bounds = {sites[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    # Returning the sites in the partitions
+    def sites(self):
+        return list(self.bounds)
+
+    # Returning the rows of a site between two dates (both included), a missing date does not limit the range
+    def slice(self, site, start=None, end=None):
+        first, last = self.bounds.get(site, (0, 0))
+        dates = self.dates[first:last]
+        low = np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left') if start is not None else 0
+        high = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right') if end is not None else len(dates)
+        return self.frame.iloc[first + low:first + max(low, high)]
+
+    # Returning the first and last date of the data
+    def date_range(self):
+        if len(self.dates) == 0:
+            return None, None
+        return pd.Timestamp(self.dates.min()), pd.Timestamp(self.dates.max())
@@ -0,0 +1,139 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Principal component analysis of the pollutant concentrations.
+# The readings of the long store are pivoted into (site-day x pollutant) chunks one
+# group of sites at a time. The concentrations are standardized with means and
+# standard deviations gathered in a first pass over the chunks, and the components
+# are fitted chunk by chunk with scikit-learn's IncrementalPCA, so the dense table of
+# all site-days is never built. Days with missing pollutants are either left out or
+# filled with the pollutant's mean. The fitted components are cached per data version.
+# Libraries needed: numpy, pandas, scikit-learn
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import hashlib
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import IncrementalPCA
+
+from air_quality.loader import POLLUTANTS, cached_artifact
+from air_quality.poc import POC_POLICY
+from air_quality.store import load_long
+
+# The ways of handling days where some of the pollutants were not measured:
+# - complete: only days where every pollutant was measured are used
+# - mean: missing pollutants are filled with the pollutant's mean, which is zero after standardizing
+PCA_MISSING = ('complete', 'mean')
+
+# Number of rows fitted at once, and about the number of readings pivoted at once
+CHUNK_ROWS = 10000
+
+
+# Pivoting the readings of the given pollutants in the long store into arrays of (site-day x pollutant) concentrations,
+# with a column per pollutant in the given order. The readings are split between sites into chunks of about chunk_rows
+# readings, all readings of a site-day belong to the same site so every site-day is complete within its chunk.
+# Site-days where none of the pollutants was measured are not part of any chunk
+def long_chunks(long_data, pollutants, chunk_rows=CHUNK_ROWS):
+    readings = long_data.loc[long_data['Pollutant'].isin(pollutants), ['Date', 'Site ID', 'Pollutant', 'Concentration']]
+    readings = readings.sort_values('Site ID', kind='stable')
+    site_ids = readings['Site ID'].to_numpy()
+    start = 0
+    while start < len(readings):
+        # Moving the end of the chunk to the last reading of its last site
+        stop = int(np.searchsorted(site_ids, site_ids[min(start + chunk_rows, len(readings)) - 1], side='right'))
+        chunk = readings.iloc[start:stop].pivot_table(index=['Site ID', 'Date'], columns='Pollutant',
+                                                      values='Concentration', aggfunc='mean', observed=True)
+        yield chunk.reindex(columns=list(pollutants)).to_numpy(dtype=float)
+        start = stop
+
+
+# Calculating the mean and standard deviation of every column over chunks of rows, missing values are skipped.
+# The counts, means and sums of squared differences of the chunks are merged with Chan et al.'s formula
+def column_scales(chunks, missing='complete'):
+    count = mean = m2 = 0
+    for chunk in chunks:
+        if missing == 'complete':
+            chunk = chunk[~np.isnan(chunk).any(axis=1)]
+        chunk_count = (~np.isnan(chunk)).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            chunk_mean = np.nan_to_num(np.nanmean(chunk, axis=0)) if len(chunk) else np.zeros(chunk.shape[1])
+        chunk_m2 = np.nansum((chunk - chunk_mean) ** 2, axis=0)
+        total = count + chunk_count
+        delta = chunk_mean - mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = mean + np.where(total > 0, delta * chunk_count / total, 0)
+            m2 = m2 + chunk_m2 + np.where(total > 0, delta ** 2 * count * chunk_count / total, 0)
+        count = total
+    scale = np.sqrt(m2 / np.maximum(np.asarray(count) - 1, 1))
+    # A column without any spread is only centered
+    return mean, np.where(scale > 0, scale, 1.0), count
+
+
+# Standardizing a chunk and handling its missing values
+def _prepare(chunk, mean, scale, missing):
+    if missing == 'complete':
+        chunk = chunk[~np.isnan(chunk).any(axis=1)]
+    return np.nan_to_num((chunk - mean) / scale)
+
+
+# Fitting the principal components of the standardized columns chunk by chunk.
+# chunks is a function returning a new iterable of (rows x columns) chunks, it is called once per pass over the data.
+# Returns a frame with one row per component (loadings of every column, explained variance and its ratio), followed by
+# the 'Mean' and 'Scale' rows used to standardize the data
+def fit_pca(chunks, columns, missing='complete', n_components=None):
+    if missing not in PCA_MISSING:
+        raise ValueError(f"Unknown missing value handling '{missing}', expected one of {PCA_MISSING}")
+    n_components = n_components or len(columns)
+    mean, scale, count = column_scales(chunks(), missing)
+    if np.min(count) < n_components:
+        raise ValueError(f'Not enough rows to fit {n_components} components')
+
+    # IncrementalPCA needs at least n_components rows per batch. Chunks are gathered into batches of CHUNK_ROWS rows and
+    # every batch is held back until the next one is full, so the rows left at the end are fitted with the last batch
+    model = IncrementalPCA(n_components=n_components)
+    batch = None
+    pending = np.empty((0, len(columns)))
+    for chunk in chunks():
+        pending = np.vstack([pending, _prepare(chunk, mean, scale, missing)])
+        if len(pending) >= CHUNK_ROWS:
+            if batch is not None:
+                model.partial_fit(batch)
+            batch, pending = pending, pending[:0]
+    model.partial_fit(pending if batch is None else np.vstack([batch, pending]))
+
+    components = [f'PC{number}' for number in range(1, n_components + 1)]
+    table = pd.DataFrame(model.components_, index=components, columns=columns)
+    table['Explained Variance'] = model.explained_variance_
+    table['Explained Variance Ratio'] = model.explained_variance_ratio_
+    standardization = pd.DataFrame([mean, scale], index=['Mean', 'Scale'], columns=columns)
+    table = pd.concat([table, standardization])
+    table.index.name = 'Component'
+    return table.reset_index()
+
+
+# Projecting rows onto the fitted components, rows are standardized and their missing values handled like in the fit.
+# Returns the scores of the rows that were kept
+def pca_scores(pca_table, frame, missing='complete'):
+    table = pca_table.set_index('Component')
+    columns = [column for column in table.columns if column not in ('Explained Variance', 'Explained Variance Ratio')]
+    values = frame[columns].to_numpy(dtype=float)
+    kept = ~np.isnan(values).any(axis=1) if missing == 'complete' else np.ones(len(values), dtype=bool)
+    prepared = _prepare(values, table.loc['Mean', columns].to_numpy(), table.loc['Scale', columns].to_numpy(), missing)
+    loadings = table.drop(index=['Mean', 'Scale'])[columns]
+    return pd.DataFrame(prepared @ loadings.to_numpy().T, index=frame.index[kept], columns=loadings.index)
+
+
+# Loading the principal components of the concentrations of the given pollutants, fitted once per data version
+# from chunks of the long store
+def load_pca(pollutants, missing='complete', policy=POC_POLICY):
+    columns = [POLLUTANTS[pollutant]['column'] for pollutant in pollutants]
+    name = f'pca_long_{missing}_{hashlib.sha1("|".join(columns).encode()).hexdigest()[:8]}_{policy}'
+
+    def build():
+        long_data = load_long(policy)
+        return fit_pca(lambda: long_chunks(long_data, pollutants), columns, missing)
+    return cached_artifact(name, build)
@@ -0,0 +1,125 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Permutation tests of the difference between the mean
+# concentrations of two sites. The site labels of the pooled readings are shuffled
+# for a whole block of permutations at once with numpy's random Generator, and
+# testing stops early once the p-value is clearly above or below the significance
+# level. Every pair of sites of every pollutant is tested in a pool of processes.
+# Libraries needed: numpy, pandas, scipy
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+from air_quality.bootstrap import DEFAULT_MAX_BYTES, block_size
+from air_quality.chisquare import adjust_p_values
+
+# Permuted differences within this relative distance of the observed difference count as ties (at least as extreme)
+_TIE_TOLERANCE = 1e-9
+
+
+# Calculating the differences of means of n_permutations random splits of the pooled readings into groups of n_a and
+# the rest. Every row of a block is one permutation of the pooled readings, and a block uses at most max_bytes
+def permuted_differences(pooled, n_a, n_permutations, rng, max_bytes=DEFAULT_MAX_BYTES):
+    n_b = len(pooled) - n_a
+    total = pooled.sum()
+    differences = np.empty(n_permutations)
+    step = block_size(len(pooled), max_bytes)
+    for start in range(0, n_permutations, step):
+        stop = min(start + step, n_permutations)
+        shuffled = rng.permuted(np.broadcast_to(pooled, (stop - start, len(pooled))), axis=1)
+        sum_a = shuffled[:, :n_a].sum(axis=1)
+        differences[start:stop] = sum_a / n_a - (total - sum_a) / n_b
+    return differences
+
+
+# Two-sided permutation test of the difference between the means of a and b.
+# Permutations are drawn in rounds of round_size. With early_stop=True testing stops as soon as a
+# Clopper-Pearson interval (at the stop_level confidence) of the p-value lies entirely above alpha or entirely below
+# alpha_low (alpha by default). A lower alpha_low keeps small p-values precise enough for a multiple testing adjustment.
+# Returns the observed difference, the p-value and the number of permutations used
+def permutation_test(a, b, n_permutations=10000, alpha=0.05, seed=None, round_size=1000, early_stop=True,
+                     stop_level=0.999, alpha_low=None, max_bytes=DEFAULT_MAX_BYTES):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) == 0 or len(b) == 0:
+        raise ValueError('Cannot compare the mean of an empty sample')
+    alpha_low = alpha if alpha_low is None else alpha_low
+    rng = np.random.default_rng(seed)
+    pooled = np.concatenate([a, b])
+    observed = a.mean() - b.mean()
+    threshold = abs(observed) * (1 - _TIE_TOLERANCE)
+
+    n_extreme = 0
+    n_used = 0
+    while n_used < n_permutations:
+        n_round = min(round_size, n_permutations - n_used)
+        differences = permuted_differences(pooled, len(a), n_round, rng, max_bytes)
+        n_extreme += int((np.abs(differences) >= threshold).sum())
+        n_used += n_round
+        if early_stop and n_used < n_permutations:
+            tail = (1 - stop_level) / 2
+            lower = stats.beta.ppf(tail, n_extreme, n_used - n_extreme + 1) if n_extreme > 0 else 0.0
+            upper = stats.beta.ppf(1 - tail, n_extreme + 1, n_used - n_extreme) if n_extreme < n_used else 1.0
+            if upper < alpha_low or lower > alpha:
+                break
+
+    # Counting the observed split as one of the permutations so the p-value is never zero
+    return observed, (n_extreme + 1) / (n_used + 1), n_used
+
+
+# ------------------------------------    All pairs of sites    ------------------------------------
+
+# Testing one (pollutant, site pair), this runs in a worker process
+def _test_pair(task):
+    pollutant, site_a, site_b, data_a, data_b, n_permutations, alpha, alpha_low, seed, early_stop, max_bytes = task
+    difference, p_value, n_used = permutation_test(data_a, data_b, n_permutations, alpha, seed, early_stop=early_stop,
+                                                   alpha_low=alpha_low, max_bytes=max_bytes)
+    return {'Pollutant': pollutant, 'Site A': site_a, 'Site B': site_b, 'N A': len(data_a), 'N B': len(data_b),
+            'Difference': difference, 'P-Value': p_value, 'Permutations': n_used}
+
+
+# Testing the difference of means of every pair of locations of the combined data for every pollutant. pollutants maps the
+# pollutant's name to its column. The pairs are independent so they are spread over a pool of n_jobs processes (all cores
+# by default, 1 runs them in this process), and every pair gets its own random stream spawned from the seed.
+# The p-values of every pollutant are adjusted for multiple testing ('holm' or 'bh', see 'air_quality/chisquare.py'), so
+# a pair only stops early below alpha / (number of pairs of its pollutant), where it is significant under either adjustment.
+# The smallest possible p-value is 1 / (n_permutations + 1), n_permutations must be large enough to go below that level
+def permutation_table(combined_data, pollutants, n_permutations=10000, alpha=0.05, seed=None, adjustment='holm',
+                      early_stop=True, n_jobs=None, max_bytes=DEFAULT_MAX_BYTES):
+    pairs = []
+    n_pairs = {}
+    for pollutant, column in pollutants.items():
+        samples = {site: site_data[column].dropna().to_numpy(dtype=float)
+                   for site, site_data in combined_data.groupby('Local Site Name', sort=True)}
+        samples = {site: data for site, data in samples.items() if len(data) > 0}
+        for site_a, site_b in itertools.combinations(samples, 2):
+            pairs.append((pollutant, site_a, site_b, samples[site_a], samples[site_b]))
+        n_pairs[pollutant] = len(samples) * (len(samples) - 1) // 2
+
+    seeds = np.random.SeedSequence(seed).spawn(len(pairs))
+    tasks = [pair + (n_permutations, alpha, alpha / n_pairs[pair[0]], pair_seed, early_stop, max_bytes)
+             for pair, pair_seed in zip(pairs, seeds)]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) <= 1:
+        rows = [_test_pair(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            rows = list(executor.map(_test_pair, tasks, chunksize=max(1, len(tasks) // (4 * n_jobs))))
+
+    columns = ['Pollutant', 'Site A', 'Site B', 'N A', 'N B', 'Difference', 'P-Value', 'Permutations']
+    table = pd.DataFrame(rows, columns=columns)
+    table['Adjusted P-Value'] = table.groupby('Pollutant')['P-Value'].transform(
+        lambda p_values: adjust_p_values(p_values, adjustment))
+    table['Significant'] = table['Adjusted P-Value'] < alpha
+    return table
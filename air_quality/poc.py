@@ -0,0 +1,74 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Collapses the readings of several instruments (POCs) at the
+# same site on the same day into one row before the files are joined. Without this
+# the duplicate (Date, Site ID) keys multiply rows in the left merges and the same
+# day is counted several times in every average.
+# Libraries needed: pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import os
+
+import pandas as pd
+
+from air_quality.loader import POLLUTANTS, load_pollutant, load_pollutants
+
+# The ways of combining several instruments' readings of the same site-day:
+# - primary: keep the reading of the site's main instrument, the POC with the most readings at that site
+# - mean: average the readings
+# - max: keep the highest reading
+POC_POLICIES = ('primary', 'mean', 'max')
+
+# The policy used by the app, it can be changed with an environment variable
+POC_POLICY = os.environ.get('AIR_QUALITY_POC_POLICY', 'primary')
+
+# Every site-day is identified by these columns
+SITE_DAY = ['Date', 'Site ID']
+
+
+# Collapsing a raw pollutant file to one row per site-day using the given policy, the POC column is dropped
+def collapse_poc(frame, pollutant, policy=POC_POLICY):
+    if policy not in POC_POLICIES:
+        raise ValueError(f"Unknown POC policy '{policy}', expected one of {POC_POLICIES}")
+    columns = [column for column in frame.columns if column != 'POC']
+    values = [POLLUTANTS[pollutant]['column'], 'Daily AQI Value']
+
+    if policy == 'primary':
+        # Ranking the instruments of every site by their number of readings, ties go to the lower POC number
+        readings = frame.groupby(['Site ID', 'POC']).size().rename('Readings')
+        ranked = frame.join(readings, on=['Site ID', 'POC'])
+        ranked = ranked.sort_values(SITE_DAY + ['Readings', 'POC'], ascending=[True, True, False, True], kind='stable')
+        # Keeping the best ranked reading of every site-day, in the order of the original file
+        collapsed = ranked.drop_duplicates(SITE_DAY).sort_index()
+    else:
+        # The descriptive columns come from the first reading of the site-day and the values are aggregated
+        grouped = frame.groupby(SITE_DAY, sort=False)
+        collapsed = grouped.first()
+        collapsed[values] = grouped[values].agg(policy)
+        collapsed = collapsed.reset_index()
+        collapsed['Daily AQI Value'] = collapsed['Daily AQI Value'].round().astype('Int64')
+
+    return collapsed[columns].reset_index(drop=True)
+
+
+# Loading every pollutant's file collapsed to one row per site-day
+def load_collapsed(policy=POC_POLICY):
+    return {pollutant: collapse_poc(frame, pollutant, policy) for pollutant, frame in load_pollutants().items()}
+
+
+# Reporting the number of rows of every file before and after collapsing, next to its number of unique site-days
+def collapse_report(policy=POC_POLICY):
+    rows = []
+    for pollutant in POLLUTANTS:
+        frame = load_pollutant(pollutant)
+        rows.append({
+            'Pollutant': pollutant,
+            'Raw Rows': len(frame),
+            'Unique Site-Days': frame.groupby(SITE_DAY).ngroups,
+            'Rows After Collapse': len(collapse_poc(frame, pollutant, policy)),
+        })
+    return pd.DataFrame(rows)
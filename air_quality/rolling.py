@@ -0,0 +1,77 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Rolling averages and NAAQS exceedances of every location and
+# pollutant. The daily values of the aggregate cube are sorted by series and date,
+# so the rolling 7-day and 30-day means of all series are calculated at once from
+# cumulative sums, with a binary search for the first day of every window. The
+# result is cached per data version next to the cube so the charts only look it up.
+# Libraries needed: numpy, pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import numpy as np
+import pandas as pd
+
+from air_quality.cube import load_cube
+from air_quality.loader import cached_artifact
+from air_quality.poc import POC_POLICY
+
+# Rolling windows in calendar days, a window holds the days of the last n calendar days that have a reading
+ROLLING_WINDOWS = {'Rolling 7-Day Mean': 7, 'Rolling 30-Day Mean': 30}
+
+# Daily National Ambient Air Quality Standards in the units of the daily files. A day exceeds the standard when its value
+# is above it. Lead's standard is a rolling 3-month average so it has no daily limit
+NAAQS = {
+    'PM2.5': 35,      # 24-hour mean, ug/m3
+    'Ozone': 0.070,   # daily max 8-hour mean, ppm
+    'SO2': 75,        # daily max 1-hour, ppb
+    'NO2': 100,       # daily max 1-hour, ppb
+    'CO': 9,          # daily max 8-hour mean, ppm
+    'PM10': 150,      # 24-hour mean, ug/m3
+}
+
+# Columns of the rolling table, it is sorted by the first three
+ROLLING_COLUMNS = ['Pollutant', 'Local Site Name', 'Date', 'Mean', 'Max'] + list(ROLLING_WINDOWS) + ['Exceeds NAAQS']
+
+
+# Calculating the rolling means of several series at once. series holds the series of every value and days its day number,
+# both sorted by series and then day. Each mean covers the values of the same series within the last window days
+def grouped_rolling_mean(series, days, values, window):
+    # Placing every series far enough from the next one that no window reaches into it
+    span = days.max() - days.min() + window + 1 if len(days) else 0
+    keys = series * span + (days - days.min() if len(days) else days)
+    first = np.searchsorted(keys, keys - (window - 1), side='left')
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    positions = np.arange(len(values))
+    return (sums[positions + 1] - sums[first]) / (positions + 1 - first)
+
+
+# Building the rolling table from the daily values of the cube, one row per (pollutant, location, day)
+def build_rolling(cube):
+    daily = cube[cube['Grain'] == 'day'].rename(columns={'Period': 'Date'})
+    daily = daily.sort_values(['Pollutant', 'Local Site Name', 'Date'], ignore_index=True)
+    series = pd.factorize(pd.MultiIndex.from_frame(daily[['Pollutant', 'Local Site Name']]))[0]
+    days = daily['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    values = daily['Mean'].to_numpy(dtype=float)
+
+    rolling = daily[['Pollutant', 'Local Site Name', 'Date', 'Mean', 'Max']].copy()
+    for column, window in ROLLING_WINDOWS.items():
+        rolling[column] = grouped_rolling_mean(series, days, values, window)
+    # The highest reading of the day is compared with the standard, pollutants without a daily standard never exceed it
+    rolling['Exceeds NAAQS'] = rolling['Max'] > rolling['Pollutant'].map(NAAQS).astype(float).fillna(np.inf)
+    return rolling[ROLLING_COLUMNS]
+
+
+# Loading the rolling table, it is built once per data version
+def load_rolling(policy=POC_POLICY):
+    return cached_artifact(f'rolling_{policy}', lambda: build_rolling(load_cube(policy)))
+
+
+# Counting the days above the NAAQS of every location (rows) and pollutant with a daily standard (columns)
+def exceedance_days(rolling):
+    table = rolling[rolling['Pollutant'].isin(NAAQS)].pivot_table(
+        index='Local Site Name', columns='Pollutant', values='Exceeds NAAQS', aggfunc='sum')
+    return table.reindex(columns=[pollutant for pollutant in NAAQS if pollutant in table.columns]).astype('Int64')
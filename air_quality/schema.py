@@ -0,0 +1,100 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Compact in-memory schema of the datasets shown on the pages.
+# Site names, units and parameter descriptions repeat a handful of values on
+# every row, so they are stored as categoricals. Concentrations are stored as
+# float32, AQI values as nullable 16-bit integers and IDs as narrow integers.
+# The suffixed site name columns of the merged dataset repeat 'Local Site Name'
+# and can be dropped. The memory of a frame before and after can be reported.
+# Usage: python -m air_quality.schema
+# Libraries needed: pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import pandas as pd
+
+from air_quality.loader import POLLUTANT_COLUMNS, POLLUTANTS
+
+# Columns (and their suffixed copies in the merged dataset) holding a few distinct text values
+CATEGORY_COLUMNS = ('Local Site Name', 'AQS Parameter Description', 'Units', 'Pollutant')
+
+# Concentration columns of the raw files, the merged and wide datasets and the long store
+CONCENTRATION_COLUMNS = tuple(POLLUTANT_COLUMNS.values()) + ('Concentration',)
+
+# Narrow types of the numeric columns. float32 keeps about 7 significant digits, more than the EPA files report.
+# The AQI is an integer from 0 to 500
+CONCENTRATION_DTYPE = 'float32'
+AQI_DTYPE = 'Int16'
+INTEGER_DTYPES = {'Site ID': 'int32', 'POC': 'int8'}
+
+# Suffixes of the columns of the merged dataset, see 'air_quality/build.py'
+SUFFIXES = tuple(spec['suffix'] for spec in POLLUTANTS.values() if spec['suffix'])
+
+
+# Returning the name of a column without the suffix added when merging
+def base_name(column):
+    for suffix in SUFFIXES:
+        if column.endswith(suffix):
+            return column[:-len(suffix)]
+    return column
+
+
+# Returning the suffixed copies of 'Local Site Name' that only repeat it: wherever they have a value it is the
+# site name of the same row. Other suffixed columns are kept since they hold the pollutant's own values
+def redundant_columns(frame):
+    if 'Local Site Name' not in frame:
+        return []
+    redundant = []
+    for column in frame.columns:
+        if column != 'Local Site Name' and base_name(column) == 'Local Site Name':
+            present = frame[column].notna()
+            if (frame.loc[present, column] == frame.loc[present, 'Local Site Name']).all():
+                redundant.append(column)
+    return redundant
+
+
+# Converting a frame to the compact schema. Columns the schema does not cover are kept as they are.
+# With drop_redundant the columns returned by redundant_columns() are dropped
+def compact(frame, drop_redundant=False):
+    frame = frame.drop(columns=redundant_columns(frame) if drop_redundant else [])
+    types = {}
+    for column in frame.columns:
+        base = base_name(column)
+        if base in CATEGORY_COLUMNS:
+            types[column] = 'category'
+        elif base in CONCENTRATION_COLUMNS:
+            types[column] = CONCENTRATION_DTYPE
+        elif base == 'Daily AQI Value':
+            # The AQI of the wide table is a mean over a single reading, so it is already a whole number
+            frame[column] = frame[column].round()
+            types[column] = AQI_DTYPE
+        elif base in INTEGER_DTYPES:
+            types[column] = INTEGER_DTYPES[base]
+    return frame.astype(types)
+
+
+# Comparing the memory of every column of a frame before and after compacting it, in megabytes.
+# The last row holds the totals of the frames
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'Type Before': before.dtypes.astype(str),
+        'MB Before': before.memory_usage(deep=True, index=False) / 1e6,
+        'Type After': after.dtypes.astype(str),
+        'MB After': after.memory_usage(deep=True, index=False) / 1e6,
+    }).reindex(before.columns)
+    # Dropped columns take no memory after compacting
+    report = report.fillna({'Type After': 'dropped', 'MB After': 0.0})
+    report.loc['Total'] = ['', report['MB Before'].sum(), '', report['MB After'].sum()]
+    return report
+
+
+if __name__ == '__main__':
+    from air_quality.loader import load_combined
+    from air_quality.store import load_long, load_wide
+
+    for name, frame in [('Merged dataset', load_combined()), ('Long store', load_long()), ('Wide table', load_wide())]:
+        report = memory_report(frame, compact(frame, drop_redundant=True))
+        print(f"{name}: {report.loc['Total', 'MB Before']:.2f} MB -> {report.loc['Total', 'MB After']:.2f} MB")
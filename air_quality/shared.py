@@ -0,0 +1,124 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Datasets shared by all sessions and worker processes of a
+# host. A dataset is written once per data version as an uncompressed Arrow IPC
+# file in the cache directory, and every process memory-maps that file and wraps
+# its buffers in a read-only DataFrame without copying them. The operating system
+# keeps a single copy of the mapped file in memory for all processes, so the
+# memory of a session no longer grows with the size of the data. The datasets are
+# stored in the compact schema of 'air_quality/schema.py'.
+# Libraries needed: pandas, pyarrow
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from air_quality.loader import CACHE_DIR, POLLUTANTS, data_version, load_combined, load_pollutant
+from air_quality.poc import POC_POLICY
+from air_quality.schema import compact
+from air_quality.store import load_long, load_sites, load_wide
+
+# The mapped files are kept here, one file per dataset and data version
+SHARED_DIR = CACHE_DIR / 'shared'
+
+# Bumping this invalidates every shared file, it must change whenever the schema of the shared datasets changes
+SHARED_FORMAT_VERSION = 2
+
+# Frames mapped by this process, keyed on the dataset's name and holding the data version they were mapped for
+_mapped = {}
+_lock = threading.Lock()
+
+
+# Converting a frame to an Arrow table. Missing values of plain float columns are kept as NaN instead of Arrow nulls,
+# so these columns can be wrapped without copying them. Nullable columns (e.g. Int64) are copied when mapped since
+# pandas keeps their missing values in a separate mask
+def to_arrow(frame):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for position, column in enumerate(frame.columns):
+        if frame[column].dtype.kind == 'f':
+            table = table.set_column(position, table.field(position), pa.array(frame[column].to_numpy(),
+                                                                               type=table.field(position).type))
+    return table
+
+
+# Writing a frame to an Arrow IPC file. The file is written next to its final name and then moved in place,
+# so other processes never map a half written file
+def write_shared(frame, path):
+    table = to_arrow(frame)
+    temp_file = path.with_suffix(f'.{os.getpid()}.tmp')
+    with pa.OSFile(str(temp_file), 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_file, path)
+
+
+# Memory-mapping an Arrow IPC file as a DataFrame. The columns that need no conversion point into the mapped file and
+# are read only, so the frame must not be changed in place (copy it first)
+def map_frame(path):
+    with pa.memory_map(str(path), 'r') as source:
+        table = ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+# Returning a dataset shared by all processes of the host, building it with build() and writing it to the shared
+# directory only when the data version has no file yet. Files of older data versions are removed.
+# Failing to write the file (e.g. a read only folder) is not an error, the built frame is used by this process only
+def shared_frame(name, build):
+    version = data_version()
+    with _lock:
+        mapped = _mapped.get(name)
+    if mapped is not None and mapped[0] == version:
+        return mapped[1]
+
+    path = SHARED_DIR / f'{name}-{SHARED_FORMAT_VERSION}-{version}.arrow'
+    if not path.exists():
+        frame = build()
+        try:
+            SHARED_DIR.mkdir(parents=True, exist_ok=True)
+            write_shared(frame, path)
+            # Processes that still map an older file keep their pages until they unmap it
+            for old_file in SHARED_DIR.glob(f'{name}-*.arrow'):
+                if old_file != path:
+                    old_file.unlink(missing_ok=True)
+        except OSError:
+            with _lock:
+                _mapped[name] = (version, frame)
+            return frame
+
+    frame = map_frame(path)
+    with _lock:
+        _mapped[name] = (version, frame)
+    return frame
+
+
+# ------------------------------------    Shared datasets    ------------------------------------
+
+# The combined dataset of all pollutants, without the suffixed site name columns that repeat 'Local Site Name'
+def shared_combined():
+    return shared_frame('combined', lambda: compact(load_combined(), drop_redundant=True))
+
+
+# The raw file of a single pollutant with the columns needed for merging
+def shared_pollutant(pollutant):
+    return shared_frame(f'raw_{POLLUTANTS[pollutant]["file"].removesuffix(".csv")}',
+                        lambda: compact(load_pollutant(pollutant)))
+
+
+# The long store, the site table and the wide table pivoted from them (see 'air_quality/store.py')
+def shared_long(policy=POC_POLICY):
+    return shared_frame(f'long_{policy}', lambda: compact(load_long(policy)))
+
+
+def shared_sites():
+    return shared_frame('sites', lambda: compact(load_sites()))
+
+
+def shared_wide(policy=POC_POLICY):
+    return shared_frame(f'wide_{policy}', lambda: compact(load_wide(policy)))
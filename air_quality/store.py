@@ -0,0 +1,81 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Module Description: Long (tidy) store of all pollutant readings. Every reading is
+# one row of (Date, Site ID, Pollutant, Concentration, Daily AQI Value) and the site
+# names and coordinates are kept once in a separate site table. Wide tables with one
+# column per pollutant are produced from the long store with a single pivot.
+# Libraries needed: pandas
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import pandas as pd
+
+from air_quality.loader import POLLUTANTS, cached_artifact, load_pollutants, load_site_columns
+from air_quality.poc import POC_POLICY, load_collapsed
+
+# Columns of the long store
+LONG_COLUMNS = ['Date', 'Site ID', 'Pollutant', 'Concentration', 'Daily AQI Value']
+
+# Columns of the site table
+SITE_COLUMNS = ['Site ID', 'Local Site Name', 'Site Latitude', 'Site Longitude']
+
+
+# Stacking the pollutant files into one long table, readings without a concentration carry no information and are dropped
+def to_long(frames):
+    parts = []
+    for pollutant, frame in frames.items():
+        part = frame[['Date', 'Site ID', POLLUTANTS[pollutant]['column'], 'Daily AQI Value']]
+        part = part.rename(columns={POLLUTANTS[pollutant]['column']: 'Concentration'})
+        part.insert(2, 'Pollutant', pollutant)
+        parts.append(part.dropna(subset=['Concentration']))
+    long_data = pd.concat(parts, ignore_index=True)
+    long_data['Pollutant'] = pd.Categorical(long_data['Pollutant'], categories=list(POLLUTANTS))
+    return long_data[LONG_COLUMNS]
+
+
+# Building the site table from the site columns of all files.
+# A site keeps the first name and coordinates found for it, and sites without a name in any file are named by their ID
+def to_sites(frames):
+    sites = pd.concat([frame[SITE_COLUMNS] for frame in frames.values()], ignore_index=True)
+    sites = sites.groupby('Site ID').first()
+    sites['Local Site Name'] = sites['Local Site Name'].fillna(sites.index.to_series().astype(str))
+    return sites.reset_index()[SITE_COLUMNS]
+
+
+# Loading the long store, it is built once per data version from the raw files collapsed to one reading per site-day
+def load_long(policy=POC_POLICY):
+    return cached_artifact(f'long_{policy}', lambda: to_long(load_collapsed(policy)))
+
+
+# Loading the site table, it is built from the raw files once per data version
+def load_sites():
+    return cached_artifact('sites', lambda: to_sites(load_pollutants(load_site_columns)))
+
+
+# Producing a wide table with one concentration column and one AQI column per pollutant, named like the columns of the
+# combined dataset, from a single pivot of the long store. Each row is one site on one day, and the site's name is looked up
+# in the site table. The long store has one reading per site-day so the mean only reshapes the data
+def wide_view(long_data, sites):
+    wide = long_data.pivot_table(index=['Date', 'Site ID'], columns='Pollutant',
+                                 values=['Concentration', 'Daily AQI Value'], aggfunc='mean', observed=True)
+
+    # Naming the columns after the combined dataset and adding pollutants that have no readings as empty columns
+    column_names = {}
+    for pollutant, spec in POLLUTANTS.items():
+        column_names[('Concentration', pollutant)] = spec['column']
+    for pollutant, spec in POLLUTANTS.items():
+        column_names[('Daily AQI Value', pollutant)] = 'Daily AQI Value' + spec['suffix']
+    wide = wide.reindex(columns=pd.MultiIndex.from_tuples(list(column_names)))
+    wide.columns = list(column_names.values())
+    wide = wide.reset_index()
+
+    wide.insert(2, 'Local Site Name', wide['Site ID'].map(sites.set_index('Site ID')['Local Site Name']))
+    return wide
+
+
+# Loading the wide table of all pollutants from the long store
+def load_wide(policy=POC_POLICY):
+    return wide_view(load_long(policy), load_sites())
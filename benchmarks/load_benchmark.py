@@ -0,0 +1,174 @@
+# ------------------------------------------------------------------------------
+# STT 810 Final Project : Michigan Air Quality Analysis
+# Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
+# Script Description: Measures how long the data pages take to load the data with
+# plain pd.read_csv compared to the shared cached loader (cold and warm cache), and
+# the wall time and peak memory (RSS) of parsing the raw files one after another
+# compared to parsing them in parallel with the Arrow csv reader
+# Usage: python benchmarks/load_benchmark.py [--copies N]
+# (--copies repeats the rows of every raw file N times for the ingest benchmark, to mimic a multi-year pull)
+# (the peak memory uses the 'resource' module, which is only available on Linux and macOS)
+# (the benchmark uses a temporary cache folder, the app's cache is not touched)
+# Refer to 'README.md' for more information
+# GitHub repository link: https://github.com/Husainz06/STT-810---Air-Quality.git
+# ------------------------------------------------------------------------------
+
+# Importing the required libraries
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# Making the project's root folder importable when running the script directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The cold start removes the whole cache, so the benchmark points the loader at a temporary folder before importing it.
+# The folder is passed on to the ingest processes through the environment and removed when the benchmark exits
+_cache_dir = tempfile.TemporaryDirectory(prefix='air_quality_benchmark_', ignore_cleanup_errors=True)
+os.environ['AIR_QUALITY_CACHE_DIR'] = _cache_dir.name
+
+from air_quality import loader
+
+
+# Timing a function over a few repeats and returning the best time in milliseconds
+def best_time(function, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+# What every page did before: parsing all the csv files with the default settings
+def read_plain():
+    for spec in loader.POLLUTANTS.values():
+        pd.read_csv(loader.DATA_DIR / spec['file'])
+    pd.read_csv(loader.DATA_DIR / loader.COMBINED_FILE)
+
+
+# Loading the same data through the shared loader
+def read_loader():
+    for pollutant in loader.POLLUTANTS:
+        loader.load_pollutant(pollutant)
+    loader.load_combined()
+
+
+# Forgetting everything cached in memory so only the Parquet files on disk are used
+def clear_memory_cache():
+    loader._frame_memo.clear()
+    loader._hash_memo.clear()
+
+
+# Removing the Parquet cache (the benchmark's temporary folder) and the in-memory cache to measure a cold start
+def clear_all_caches():
+    clear_memory_cache()
+    shutil.rmtree(loader.CACHE_DIR, ignore_errors=True)
+
+
+# ------------------------------------    Ingest    ------------------------------------
+
+# The raw files in a folder and the columns read from them
+def ingest_jobs(data_dir=loader.DATA_DIR):
+    return [(Path(data_dir) / spec['file'], loader.raw_dtypes(pollutant)) for pollutant, spec in loader.POLLUTANTS.items()]
+
+
+# Writing every raw file to a folder with its rows repeated the given number of times
+def write_copies(data_dir, copies):
+    for spec in loader.POLLUTANTS.values():
+        header, rows = (loader.DATA_DIR / spec['file']).read_text().split('\n', 1)
+        rows = rows if rows.endswith('\n') else rows + '\n'
+        (Path(data_dir) / spec['file']).write_text(header + '\n' + rows * copies)
+
+
+# Ways of parsing the raw files, every one is measured in its own process so its peak memory is its own:
+# - pandas serial: the default C parser, one file after another (how the loader used to parse them)
+# - arrow serial: the Arrow reader on a single thread, one file after another
+# - arrow parallel: the Arrow reader on all its threads, several files at once on a thread pool
+def ingest_pandas_serial(jobs):
+    for path, dtypes in jobs:
+        pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, na_values=loader.NA_VALUES)
+
+
+def ingest_arrow_serial(jobs):
+    for path, dtypes in jobs:
+        loader.parse_csv(path, dtypes, use_threads=False)
+
+
+def ingest_arrow_parallel(jobs):
+    with ThreadPoolExecutor(max_workers=loader.INGEST_THREADS) as pool:
+        list(pool.map(lambda job: loader.parse_csv(*job), jobs))
+
+
+INGEST_MODES = {'pandas serial': ingest_pandas_serial, 'arrow serial': ingest_arrow_serial,
+                'arrow parallel': ingest_arrow_parallel}
+
+
+# Peak memory (RSS) of this process in megabytes. On Linux the peak of getrusage() is inherited from the parent process,
+# so the peak of the process's own memory (VmHWM) is read instead. The 'resource' module reports bytes on macOS
+def peak_rss():
+    try:
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) for line in status if line.startswith('VmHWM:')) / 2 ** 10
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+# Running one ingest mode and printing its best time, its peak memory and how much of it the parsing added
+def run_ingest(mode, data_dir):
+    jobs = ingest_jobs(data_dir)
+    start_rss = peak_rss()
+    wall = best_time(lambda: INGEST_MODES[mode](jobs), repeats=3)
+    print(f'{wall} {peak_rss()} {peak_rss() - start_rss}')
+
+
+# Measuring every ingest mode in a new process, on the raw files with their rows repeated the given number of times
+def ingest_benchmark(copies=1):
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        if copies > 1:
+            write_copies(data_dir, copies)
+        else:
+            data_dir = loader.DATA_DIR
+        for mode in INGEST_MODES:
+            output = subprocess.run([sys.executable, __file__, '--ingest', mode, '--data-dir', str(data_dir)],
+                                    capture_output=True, text=True, check=True)
+            results[mode] = [float(value) for value in output.stdout.split()]
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the data loading')
+    parser.add_argument('--copies', type=int, default=1, help='number of times the rows of the raw files are repeated')
+    parser.add_argument('--ingest', choices=list(INGEST_MODES), help='run a single ingest mode (used internally)')
+    parser.add_argument('--data-dir', default=loader.DATA_DIR, help='folder of the raw files (used internally)')
+    arguments = parser.parse_args()
+    if arguments.ingest:
+        run_ingest(arguments.ingest, arguments.data_dir)
+        sys.exit()
+
+    plain = best_time(read_plain)
+    cold = best_time(lambda: (clear_all_caches(), read_loader()))
+    read_loader()
+    disk = best_time(lambda: (clear_memory_cache(), read_loader()))
+    memory = best_time(read_loader)
+
+    print(f'pd.read_csv on every page load      : {plain:8.1f} ms')
+    print(f'loader, cold (parse + write cache)  : {cold:8.1f} ms')
+    print(f'loader, new process (Parquet cache) : {disk:8.1f} ms')
+    print(f'loader, same process (memory cache) : {memory:8.1f} ms')
+
+    print()
+    print(f'Parsing the {len(ingest_jobs())} raw files x {arguments.copies} ({loader.INGEST_THREADS} files at once in parallel):')
+    print(f'{"":16}{"wall time":>12}{"peak RSS":>12}{"added RSS":>12}')
+    for mode, (wall, peak, added) in ingest_benchmark(arguments.copies).items():
+        print(f'{mode:16}{wall:9.1f} ms{peak:9.1f} MB{added:9.1f} MB')
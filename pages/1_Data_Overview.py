@@ -1,7 +1,7 @@
 # ------------------------------------------------------------------------------
 # STT 810 Final Project : Michigan Air Quality Analysis
 # Authors: Hussian Aljafer , Jack Ruhala , Bhavya Chawla
-# Page Description: This page loads and combines the data, creates a combined data file
+# Page Description: This page shows how the data is combined, reads the combined data file
 # calculates basic descriptive statistics, and analyzes missing values
 # Date Created: Dec. 2024
 # Libraries needed to run the page: streamlit, pandas, plotly
@@ -10,9 +10,17 @@
 # ------------------------------------------------------------------------------
 
 # Importing required libraries
+import inspect
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from air_quality import load_combined, load_raw_sample
+from air_quality.build import merge_pollutants, row_count_report
+from air_quality.loader import data_version
+from air_quality.missingness import coverage
+from air_quality.poc import POC_POLICY
+from air_quality.schema import memory_report
+from air_quality.shared import shared_combined, shared_long, shared_pollutant, shared_sites
 
 #------------------------------------    Section1: overview ------------------------------------
 st.title('Data Overview')
@@ -23,46 +31,20 @@ st.write("Data sets were obtained from epa.gov as seperate files for each of \
          losing data. Below is an overview of the dataset that we created.")
 
 
-# Reading all csv files
-co_data = pd.read_csv('2023_CO.csv')
-ozone_data = pd.read_csv('2023_Ozone.csv')
-no2_data = pd.read_csv('2023_NO2.csv')
-pb_data = pd.read_csv('2023_Pb.csv')
-pm10_data = pd.read_csv('2023_PM10.csv')
-pm25_data = pd.read_csv('2023_PM25.csv')
-so2_data = pd.read_csv('2023_SO2.csv')
-
 # Sample raw data: CO data
 st.subheader('Raw Data Sample')
 st.write("""Below is a sample of the raw data we acquired form the EPA website which shows CO data.""")
 
-# Showing the first 50 entries of the raw CO dataset
-st.write(co_data.head(50))
+# Showing the first 50 entries of the raw CO dataset with all of its columns
+st.write(load_raw_sample('CO', 50))
 st.write("""The dataset above only contains the data for one pollutant, but all pollutants should be included in 
          the data moving forward.""")
 
-# Selecting columns to merge to the full dataset
-# CO dataset
-co_data_columns = co_data[['Date', 'Site ID','Local Site Name','Site Latitude','Site Longitude', 
-                            'AQS Parameter Description','Daily Max 8-hour CO Concentration','Units','Daily AQI Value']]
-# Ozone dataset
-ozone_data_columns = ozone_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description',
-                                  'Daily Max 8-hour Ozone Concentration','Units','Daily AQI Value']]
-# NO2 dataset
-no2_data_columns = no2_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description','Daily Max 1-hour NO2 Concentration'
-                             ,'Units','Daily AQI Value']]
-# Pb dataset
-pb_data_columns = pb_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description','Daily Mean Pb Concentration'
-                             ,'Units','Daily AQI Value']]
-# PM10 dataset
-pm10_data_columns = pm10_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description','Daily Mean PM10 Concentration'
-                             ,'Units','Daily AQI Value']]
-# PM2.5 dataset
-pm25_data_columns = pm25_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description','Daily Mean PM2.5 Concentration'
-                             ,'Units','Daily AQI Value']]
-# SO2 dataset
-so2_data_columns = so2_data[['Date', 'Site ID','Local Site Name','AQS Parameter Description','Daily Max 1-hour SO2 Concentration'
-                             ,'Units','Daily AQI Value']]
+# Reading the CO file through the shared loader, which only reads the columns needed for the merge
+# (see 'air_quality/loader.py'). For CO these are Date, Site ID, POC, Local Site Name, Site Latitude, Site Longitude,
+# AQS Parameter Description, the concentration, Units and Daily AQI Value
+# The datasets of this page are memory-mapped files shared by all sessions (see 'air_quality/shared.py')
+co_data_columns = shared_pollutant('CO')
 
 
 
@@ -85,20 +67,33 @@ Below is a sample of what the full data table looks like after combining all cri
 # Showing the first 50 entries of the CO dataset after selecting columns
 st.write(co_data_columns.head(50))
 
-# Mergging datasets one by on and assigning suffixes to avoid column ambiguity
-combined_data = pd.merge(pm25_data_columns, ozone_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_ozone'))
-combined_data = pd.merge(combined_data, so2_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_so2'))
-combined_data = pd.merge(combined_data, no2_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_no2'))
-combined_data = pd.merge(combined_data, co_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_co'))
-combined_data = pd.merge(combined_data, pm10_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_pm10'))
-combined_data = pd.merge(combined_data, pb_data_columns, on=['Date', 'Site ID'], how='left',suffixes=('', '_pb'))
-
-# Generating a combined data file to be used for the rest of the project
-# We could have created this once and used it throughout the project but we kept it here for 2 reasong:
+# Reading the combined data file.
+# The merge used to run here on every page view and rewrote the file each time. It now runs as a build step
+# ('python -m air_quality.build') that only merges the files again when one of them changes, so this page just reads the result.
+# We still show the merging code below for 2 reasons:
 # 1- To show the cleaning and merging process.
-# 2- if we decide to allow the user to upload their own epa files, this code will be able to process those files.
+# 2- if we decide to allow the user to upload their own epa files, the same function will be able to process those files.
+# Extracts too large for memory (many years or states) are merged one year at a time by the out-of-core engine instead
+# ('python -m air_quality.ooc merge OUTPUT_DIR', see 'air_quality/ooc.py')
+combined_data = shared_combined()
+
+with st.expander("Show the code used to merge the datasets"):
+    st.code(inspect.getsource(merge_pollutants), language='python')
+
+# Counting the rows before and after collapsing duplicate instruments (see 'air_quality/poc.py'),
+# the counts read every raw file so they are calculated once per data version
+@st.cache_data(show_spinner=False)
+def row_counts(version):
+    return row_count_report()
 
-combined_data.to_csv('pollution_data_2023_all.csv', index=False)
+
+# Showing the row counts
+st.subheader("Collapsing Duplicate Instruments")
+st.write(f"""Some sites measure the same pollutant with more than one instrument (identified by its POC number), which gives
+         more than one row for the same site and day. Before merging, these rows are collapsed into one using the
+         '{POC_POLICY}' policy. The table below shows the number of rows before and after collapsing. After collapsing, the
+         merged dataset has exactly one row per site and day with a PM2.5 reading.""")
+st.write(row_counts(data_version()))
 
 # ------------------------------------    Section 3: generated data    ------------------------------------    
 st.subheader("Generated Data Sample")
@@ -111,13 +106,47 @@ st.write("""The merging of datasets resulted in lots of missing values since not
 st.write(combined_data.head(50))
 
 
+# ------------------------------------    Subsection 3.1: long format data    ------------------------------------
+st.subheader("Long Format Data")
+st.write("""Most of the merged columns are repeated site names, units and descriptions, or missing values. The other pages
+         use a long format version of the data instead, where each row is one reading of one pollutant at one site on one day,
+         and the site names and coordinates are kept once in a separate site table. Tables with one column per pollutant are
+         created from it when needed.""")
+
+# Loading the long data and the site table
+long_data = shared_long()
+sites = shared_sites()
+
+# Showing samples of both tables and comparing their memory use with the merged dataset
+st.write(long_data.head(20))
+st.write(sites)
+long_memory = (long_data.memory_usage(deep=True).sum() + sites.memory_usage(deep=True).sum()) / 1e6
+combined_memory = combined_data.memory_usage(deep=True).sum() / 1e6
+st.write(f"Memory used by the merged dataset: {combined_memory:.1f} MB, by the long data and site table: {long_memory:.1f} MB")
+
+
+# Comparing the memory of the merged dataset as parsed from the csv file with the compact schema used by the pages,
+# the report is calculated once per data version
+@st.cache_data(show_spinner=False)
+def schema_report(version):
+    return memory_report(load_combined(), shared_combined())
+
+
+st.write("""All pages keep the data in a compact format: site names, units and descriptions are stored once per distinct
+         value (as categories), concentrations use single precision, AQI values use small integers, and the suffixed site name
+         columns that repeat 'Local Site Name' are dropped. The table below shows the memory of every column of the merged
+         dataset before and after (see 'air_quality/schema.py').""")
+with st.expander("Show the memory of every column"):
+    st.dataframe(schema_report(data_version()))
+
+
 # ------------------------------------    Section 4: Descriptive statistics    ------------------------------------
 st.subheader("Basic Statistics")
 st.write("""The first step of analysis is to calculate basic statistics on the dataset to 
          get an idea for how our data is distributed. Below is a statistical summery of the data.""")
 
-# Shoiwng the descriptive statistics
-st.write(combined_data.describe())
+# Shoiwng the descriptive statistics, the parsed dates are left out like the text columns
+st.write(combined_data.drop(columns='Date').describe())
 
 
 # Pollutant names list to be used to filter the data in the following section
@@ -149,16 +178,21 @@ st.subheader("Pollutant Missing Data Heatmap")
 st.write("""As we have mentioned, we have lots of missing data in our dataset that we can visualize in the
          heatmaps below.""")
 
-# Encoding missing values for easier processing 
-missing_data = combined_data[pollutants].isnull().astype(int)
+# Summarizing the missing values as the fraction of available values per location and pollutant and per date and pollutant,
+# so the heatmaps show one column per location or date instead of one column per row of the dataset
+site_coverage = coverage(combined_data, pollutants, 'Local Site Name')
+date_coverage = coverage(combined_data, pollutants, 'Date')
 
 # Generating a heatmap using plotly's graph objects
 heatmap = go.Heatmap(
     # Transpose to have pollutants on y-axis for better visualization
-    z=missing_data.T.values,  
+    z=site_coverage.T.values,  
     # Using location as the x-axis to show missingness based on location
-    x=combined_data['Local Site Name'],
-    y=pollutants
+    x=site_coverage.index,
+    y=pollutants,
+    zmin=0,
+    zmax=1,
+    colorbar={'title': 'Fraction Available'}
 )
 
 # Updating the heatmap's layout to edit the size and features
@@ -176,10 +210,13 @@ st.plotly_chart(fig)
 # Generating a heatmap for the dates as the x-axis using plotly's graph objects
 heatmap = go.Heatmap(
     # Transpose to have pollutants on y-axis for better visualization
-    z=missing_data.T.values, 
+    z=date_coverage.T.values, 
     # Using date as the x-axis to show missingness based on dates 
-    x=combined_data['Date'],
-    y=pollutants
+    x=date_coverage.index,
+    y=pollutants,
+    zmin=0,
+    zmax=1,
+    colorbar={'title': 'Fraction Available'}
 )
 
 # Updating the heatmap's layout to edit the size and features
@@ -194,6 +231,29 @@ fig.update_layout(
 #showing the plot on the screen
 st.plotly_chart(fig)
 
+# Drilling down to the individual rows of a single location
+st.write("""To see the individual days behind these fractions, select a location below.""")
+drill_location = st.selectbox("Select a Location", ['None'] + list(site_coverage.index))
+if drill_location != 'None':
+    # Encoding available values as 1 for the rows of the selected location only
+    site_rows = combined_data[combined_data['Local Site Name'] == drill_location]
+    heatmap = go.Heatmap(
+        z=site_rows[pollutants].notna().astype(int).T.values,
+        x=site_rows['Date'],
+        y=pollutants,
+        zmin=0,
+        zmax=1
+    )
+    fig = go.Figure(data=[heatmap])
+    fig.update_layout(
+        title=f'Missing Data at {drill_location}',
+        xaxis_title='Date',
+        yaxis_title='Pollutants',
+        height = 550,
+        width = 1500
+    )
+    st.plotly_chart(fig)
+
 
 
 # ------------------------------------ Subsection 5.2: interpretting heatmaps    ------------------------------------
@@ -206,9 +266,10 @@ st.markdown("""
             in the analysis. Here is how to interpret the missing data heatmap:
 
 - **Colors**: Color coding is used to indicate the presence or absence of data. 
-  - The**light or white areas represented by a 0** represent **missing data**, while **darker colors represented by a 1**, represent **available data**.
+  - Each cell shows the fraction of rows with available data, **0** means **all data is missing** and **1** means **all data is available**.
 - **Rows**: Each row represents a different variable (i.e., pollutant or feature) in the dataset.
-- **Columns**: Each column represents a data point for the corresponding variable. """)
+- **Columns**: Each column represents a location or a date, and summarizes all data points of that location or date.
+  In the heatmap of a single location, each column is one day. """)
 
 # ------------------------------------ Subsection 5.3: insights form the heatmaps    ------------------------------------
 
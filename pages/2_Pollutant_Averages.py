@@ -10,18 +10,78 @@
 # ------------------------------------------------------------------------------
 
 # Importing the required libraries
+import calendar
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import matplotlib.pyplot as plt
 import numpy as np
+from air_quality.aggregates import refresh_aggregates
+from air_quality.bootstrap import adaptive_bootstrap_mean, bootstrap_mean, bootstrap_table
+from air_quality.cube import GRAINS, CubeIndex, load_cube
+from air_quality.events import load_episodes
+from air_quality.figures import render_figure
+from air_quality.loader import data_version
+from air_quality.ooc import ENGINE, SCAN_FILTERS, site_aggregates
+from air_quality.partitions import SitePartitions
+from air_quality.rolling import NAAQS, ROLLING_WINDOWS, exceedance_days, load_rolling
+from air_quality.shared import shared_wide
+from air_quality.store import load_sites
 
 
 # Page title
 st.title("Average Pollutants")
 
-# Reading the combined dataset
-combined_data = pd.read_csv('pollution_data_2023_all.csv')
+# The out-of-core engine only calculates the averages and maxima, the other sections of the page use the 2023 files
+if ENGINE == 'ooc':
+    st.info("""The averages and maxima are calculated from the partitioned dataset (out-of-core engine). The date chart, the
+            days above the standards, the pollution episodes and the bootstraps still use the 2023 files.""")
+
+# ------------------------------------    Page inputs    ------------------------------------
+# Streamlit runs the whole page again after every widget change. The inputs of the page are built once per data version and
+# kept by Streamlit between reruns, and every section with widgets is a fragment (st.fragment), so changing a widget only
+# reruns the section it belongs to
+
+# The combined dataset as a wide table (one column per pollutant) pivoted from the long store. It is a memory-mapped file
+# shared by all sessions and processes of the host, and it is read only (see 'air_quality/shared.py')
+combined_data = shared_wide()
+
+# Loading the tables of the page. st.cache_data gives every rerun its own copy, so a section can change its tables
+@st.cache_data(show_spinner=False)
+def load_tables(version):
+    # Reading the average and max of each pollutant in each location from the running aggregates.
+    # The aggregates are saved between runs and only the readings added to the raw files since the last run are merged
+    # into them, so this does not go over the whole year again (see 'air_quality/aggregates.py')
+    # With the out-of-core engine the aggregates are calculated from the partitioned dataset one year at a time instead
+    # (see 'air_quality/ooc.py')
+    if ENGINE == 'ooc':
+        aggregates, sites = site_aggregates(**SCAN_FILTERS)
+    else:
+        aggregates = refresh_aggregates()
+        sites = load_sites()
+    return {
+        'averages': aggregates.pivot(sites, 'Mean'),
+        'maxima': aggregates.pivot(sites, 'Max'),
+        'site_statistics': aggregates.by_site_name(sites),
+        # Days above the air quality standards and the detected pollution episodes
+        # (see 'air_quality/rolling.py' and 'air_quality/events.py')
+        'exceedances': exceedance_days(load_rolling()),
+        'episodes': load_episodes(),
+    }
+
+
+# Loading the lookup structures of the date chart, they are only read so all reruns share them (st.cache_resource):
+# the aggregate cube (location x pollutant x day/week/month), the data partitioned by location and sorted by date,
+# and the rolling 7-day and 30-day means of every location and pollutant
+@st.cache_resource(show_spinner=False)
+def load_lookups(version):
+    return (CubeIndex(load_cube()), SitePartitions(shared_wide()),
+            load_rolling().set_index(['Pollutant', 'Local Site Name']).sort_index())
+
+
+version = data_version()
+tables = load_tables(version)
+cube, partitions, rolling = load_lookups(version)
 
 # Defining columns needed for processing
 pollutants = [
@@ -42,9 +102,8 @@ st.write("""An important measures of analysis is calculating the average of all
          average of the pollutants per location on any given day. As mentioned in the 'Data Overview' page, some locations
          do not keep track of all pollutants and that's why some data is not present in this table.""")
 
-# Calculating the average of each pollutant grouping by the site name
-# to get the average of each pololutant in each location
-average_pollutants = combined_data.groupby('Local Site Name')[pollutants].mean().reset_index()
+# Reading the average of each pollutant in each location from the running aggregates (see the page inputs above)
+average_pollutants = tables['averages']
 
 # Displaying the results as a table
 st.table(average_pollutants)
@@ -94,63 +153,63 @@ pollutants_dictionary = {
     'PM10': 'Daily Mean PM10 Concentration',
     'Pb': 'Daily Mean Pb Concentration'
 }
-# Creating a dropdown menu that pulls the pollutant dictionary keys as its options
-# The option 'All Pollutants' is added to allow displaying all pollutants
-selected_pollutant2 = st.selectbox("Select a Pollutant (or All)" 
-                , ["All Pollutants"] + list(pollutants_dictionary.keys()), key="pollutant_select")
-
-# Selecting between displayin all pollutant data vs a single pollutant based on the user's choice
-if selected_pollutant2 != "All Pollutants":
+# The pollutant selection only reruns this plot
+@st.fragment
+def max_concentration_section():
+    # Creating a dropdown menu that pulls the pollutant dictionary keys as its options
+    # The option 'All Pollutants' is added to allow displaying all pollutants
+    selected_pollutant2 = st.selectbox("Select a Pollutant (or All)" 
+                    , ["All Pollutants"] + list(pollutants_dictionary.keys()), key="pollutant_select")
+
+    # Selecting between displayin all pollutant data vs a single pollutant based on the user's choice
+    if selected_pollutant2 != "All Pollutants":
     
-    # ussing agg() and NamedAgg() to apply the max() function to the selected column to select the daily max concentration 
-    filtered_data = combined_data.groupby('Local Site Name').agg(
-        Max_Concentration=pd.NamedAgg(column=pollutants_dictionary[selected_pollutant2], aggfunc='max')
-    ).reset_index()
-
-else:
-    # If "All Pollutants" is selected, stack the data for plotting
-    # Using the melt function to combine pollutants into one column
-    melted_data = combined_data.melt(
-        id_vars='Local Site Name', 
-        value_vars=[v for v in pollutants_dictionary.values() if v is not None],
-        var_name='Pollutant', 
-        value_name='Concentration'
-    )
-    filtered_data = melted_data.groupby(['Local Site Name', 'Pollutant']).agg(Max_Concentration=('Concentration', 'max')).reset_index()
-
-# Create the bar plot 
-if not filtered_data.empty:
-    # Checing if we have all pollutants to stack them all
-    if selected_pollutant2 == "All Pollutants":
-        fig = px.bar(
-            filtered_data,
-            x='Local Site Name',
-            y='Max_Concentration',
-            color='Pollutant',
-            title="Air Quality Levels by Location",
-            labels={"Local Site Name": "Location", "Max_Concentration": "Max Concentration"},
-            text='Max_Concentration'
-        )    
-    # Plotting a single pollutant  
+        # Reading the max of the selected pollutant per location from the running aggregates
+        filtered_data = tables['maxima'][['Local Site Name', pollutants_dictionary[selected_pollutant2]]]
+        filtered_data = filtered_data.rename(columns={pollutants_dictionary[selected_pollutant2]: 'Max_Concentration'}).dropna()
+
     else:
-        fig = px.bar(
-            filtered_data,
-            x='Local Site Name',
-            y='Max_Concentration',
-            # Reading the pollutant name and including it in the title of the plot
-            title=f"{selected_pollutant2} Levels by Location",
-            labels={"Local Site Name": "Location", "Max_Concentration": "Max Concentration"},
-            text='Max_Concentration'
-        )
+        # If "All Pollutants" is selected, stack the data for plotting
+        # The aggregates already have one row per location and pollutant
+        filtered_data = tables['site_statistics'].rename(columns={'Max': 'Max_Concentration'})
+        filtered_data['Pollutant'] = filtered_data['Pollutant'].map(pollutants_dictionary)
+        filtered_data = filtered_data[['Local Site Name', 'Pollutant', 'Max_Concentration']]
+
+    # Create the bar plot 
+    if not filtered_data.empty:
+        # Checing if we have all pollutants to stack them all
+        if selected_pollutant2 == "All Pollutants":
+            fig = px.bar(
+                filtered_data,
+                x='Local Site Name',
+                y='Max_Concentration',
+                color='Pollutant',
+                title="Air Quality Levels by Location",
+                labels={"Local Site Name": "Location", "Max_Concentration": "Max Concentration"},
+                text='Max_Concentration'
+            )    
+        # Plotting a single pollutant  
+        else:
+            fig = px.bar(
+                filtered_data,
+                x='Local Site Name',
+                y='Max_Concentration',
+                # Reading the pollutant name and including it in the title of the plot
+                title=f"{selected_pollutant2} Levels by Location",
+                labels={"Local Site Name": "Location", "Max_Concentration": "Max Concentration"},
+                text='Max_Concentration'
+            )
     
-    # Show values on top of the bars for easier readability
-    fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-    fig.update_layout(height=800) 
-    # Show the plot
-    st.plotly_chart(fig)
-# When do data is found
-else:
-    st.write("No data available for the selected pollutant and locations.")
+        # Show values on top of the bars for easier readability
+        fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+        fig.update_layout(height=800) 
+        # Show the plot
+        st.plotly_chart(fig)
+    # When do data is found
+    else:
+        st.write("No data available for the selected pollutant and locations.")
+
+max_concentration_section()
 
 # Elaboration text below the plot 
 st.markdown("""While not expicitly shown by the data, We can see a pattern in the plot above where the higher the total polutents in an area, the more polutents are recorded in the area.
@@ -167,29 +226,64 @@ st.markdown(""" Understanding pollution over time can help identify temporal tre
 Use the drop-down menus below to display average pollutant level on some michigan locations. If there's no information on the plot, 
             this means that the pollutant is not being tracked at that location.""")
 
-# Plot 2
-#Using the same dictionary above to create a menu
-# dropdown menu with a different name to separate the plots and their menus
-selected_pollutant = st.selectbox("Select a Pollutant", list(pollutants_dictionary.keys()))
-
-# Getting all locations and avoiding redunduncy by using unique()
-locations = combined_data['Local Site Name'].unique()
-
-# Getting the selected location based on the user's choice
-selected_location = st.selectbox("Select a Location", locations)
-
-# Using the selections to filter data
-filtered_data = combined_data[combined_data['Local Site Name'] == selected_location]
-
-# Creating a plot using plotly
-# Using the selected data for labeling
-fig = px.bar(filtered_data, x='Date', y=pollutants_dictionary[selected_pollutant],
-    title=f"{selected_pollutant} Levels at {selected_location}",labels={"x": "Date", "y": selected_pollutant})
-#displaying the plot
-st.plotly_chart(fig)
+# The selections below only rerun the date chart and the episodes
+@st.fragment
+def date_section():
+    # Plot 2
+    #Using the same dictionary above to create a menu
+    # dropdown menu with a different name to separate the plots and their menus
+    selected_pollutant = st.selectbox("Select a Pollutant", list(pollutants_dictionary.keys()))
+
+    # Getting all locations from the partitions, every location is stored once
+    locations = partitions.sites()
+
+    # Getting the selected location based on the user's choice
+    selected_location = st.selectbox("Select a Location", locations)
+
+    # Selecting whether to show daily values or weekly or monthly averages
+    selected_grain = st.selectbox("Select a Time Grain", list(GRAINS.keys()), format_func=str.capitalize)
+
+    # Selecting a single month, or any range of dates when the whole year is selected
+    first_date, last_date = partitions.date_range()
+    selected_month = st.selectbox("Select a Month", ["All Year"] + list(calendar.month_name[1:]))
+    if selected_month == "All Year":
+        selected_dates = st.date_input("Select a Date Range", (first_date, last_date), min_value=first_date, max_value=last_date)
+        # While the user is picking the range only the start date is set, and a cleared range shows the whole year
+        if len(selected_dates) == 0:
+            selected_dates = (first_date, last_date)
+        start_date, end_date = selected_dates[0], selected_dates[-1]
+    else:
+        start_date = pd.Timestamp(first_date.year, list(calendar.month_name).index(selected_month), 1)
+        end_date = start_date + pd.offsets.MonthEnd(0)
+
+    # Daily values are read from the rows of the location, which are stored together and sorted by date, so the date range is
+    # found with a binary search. Weekly and monthly averages are looked up in the aggregate cube the same way
+    if selected_grain == 'day':
+        filtered_data = partitions.slice(selected_location, start_date, end_date)
+        x_column, y_column = 'Date', pollutants_dictionary[selected_pollutant]
+    else:
+        filtered_data = cube.query(selected_grain, selected_pollutant, selected_location, start_date, end_date)
+        x_column, y_column = 'Period', 'Mean'
+
+    # Creating a plot using plotly
+    # Using the selected data for labeling
+    fig = px.bar(filtered_data, x=x_column, y=y_column,
+        title=f"{selected_pollutant} Levels at {selected_location}",labels={x_column: "Date", y_column: selected_pollutant})
+
+    # Overlaying the rolling means and the daily air quality standard on the daily values
+    if selected_grain == 'day' and (selected_pollutant, selected_location) in rolling.index:
+        location_rolling = rolling.loc[(selected_pollutant, selected_location)]
+        location_rolling = location_rolling[(location_rolling['Date'] >= pd.Timestamp(start_date))
+                                            & (location_rolling['Date'] <= pd.Timestamp(end_date))]
+        for column in ROLLING_WINDOWS:
+            fig.add_scatter(x=location_rolling['Date'], y=location_rolling[column], mode='lines', name=column)
+        if selected_pollutant in NAAQS:
+            fig.add_hline(y=NAAQS[selected_pollutant], line_dash='dash', line_color='red', annotation_text='NAAQS')
+    #displaying the plot
+    st.plotly_chart(fig)
 
-# Elaboration on the spikes in the plots
-st.markdown("""
+    # Elaboration on the spikes in the plots
+    st.markdown("""
 When we look at the month-filtered plot, we can see a clear outlier in some pollutants around mid 2023. 
             if we compare the mid summer outliers events during the year, we find that the polutent outliers was most likely cused by a wildfire. 
             **Canada** in mid 2023, particularly in the **Quebec** and **Ontario** regions experiance some of the worst wildfires ever recorded.
@@ -202,34 +296,27 @@ During the wildfire event, spikes in PM2.5, ozone, and other pollutants were not
             The plot we see may reflect these sudden increases in pollutant levels, showing a temporary but significant rise in 
             concentrations that corresponds with the wildfire smoke's reach.
 """)
+    # Showing the episodes found by the event detector for the pollutant selected above (see 'air_quality/events.py')
+    st.markdown("""The table below lists the episodes of unusually high readings of the selected pollutant found in the data. A day is
+            flagged at a location when its reading is far above the median of the previous 30 readings of that location (a robust
+            z-score above 3.5) and among the highest 10% of the pollutant's readings, and flagged days of any location that are at most
+            one day apart are merged into one episode. The largest PM2.5 episodes line up with the wildfire smoke of June 2023.""")
+    episodes = tables['episodes']
+    st.dataframe(episodes[episodes['Pollutant'] == selected_pollutant].drop(columns='Pollutant'), hide_index=True)
+date_section()
+
+#------------------------------------    Subection 2.3: Days above the air quality standards ------------------------------------
+st.subheader("Days Above the Air Quality Standards")
+st.markdown("""The EPA sets National Ambient Air Quality Standards (NAAQS) for the daily levels of most pollutants. The table below
+            counts the days where the highest reading at every location was above the daily standard (lead's standard is a
+            3-month average so it is not included). Empty cells mark pollutants that are not tracked at the location.""")
+st.dataframe(tables['exceedances'])
 
 
 # ------------------------------------    Subection 3: Bootstrapping ------------------------------------
 
-# Function to perform bootstrapping for the mean using numpy
-# setting default values for the iterations(samples) and CI
-def bootstrap_mean(data, n_iterations=1000, conf_lev= 95):
-    # Getting the sample's size
-    sample_size = len(data) 
-    #list to save the means 
-    means = []
-
-    # looping as many times as requested based on the function's input
-    for i in range(n_iterations):
-        sample = np.random.choice(data, size=sample_size, replace=True)
-        means.append(np.mean(sample))
-    
-    lower_conf = (100 - conf_lev)/2
-    upper_conf = 100 - lower_conf
-
-    # calculating the means
-    means = np.array(means)
-
-    # calculating lower and upper CI bounds
-    lower_bound = np.percentile(means, lower_conf)#2.5) 
-    upper_bound = np.percentile(means, upper_conf)
-    # returning means, lower bound, and upper bound
-    return means, lower_bound, upper_bound
+# The bootstrapping function is in 'air_quality/bootstrap.py', it draws the resamples in blocks
+# with numpy's random Generator instead of one at a time
 
 # Section title and text
 st.header("Bootstrapping the Mean of a Pollutant")
@@ -258,47 +345,101 @@ This approach gives us a clearer picture of the variability in pollutant concent
         
 """)
 
-# Dropdown menu form the same distionary above
-selected_pollutant3 = st.selectbox("Select a Pollutant (or All)",list(pollutants_dictionary.keys()))
-
-# Numberical input for the CIs
-confidence_level = st.number_input("Select Confidence Level", min_value = 0, max_value = 100, value = 95, step = 5)
-
-# Numerical input for the number of samples
-n_samples = st.number_input("Select Number of Samples", min_value = 100, max_value = 100000, value = 500, step = 100)
-
-# Selecting non-null data for the computation
-data = combined_data[pollutants_dictionary[selected_pollutant3]].dropna()
-
-# Perform bootstrapping
-# Adding st.spinner to show a spinning circle while the plot is loading.
-# Wde added this since sometimes the plot may take a while to load
-
-with st.spinner("Generating confidence intervals....Please wait."):
-
-    #calling the bootstrap function
-    means, lower_bound, upper_bound = bootstrap_mean(data, n_iterations= n_samples, conf_lev=confidence_level)
-
+# Bootstrapping the mean of a pollutant, memoized on the selection so going back to an earlier selection is instant
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_bootstrap(version, pollutant, mode, n_samples, confidence_level, tolerance, seed):
+    data = shared_wide()[pollutants_dictionary[pollutant]].dropna()
+    if mode == "Adaptive (stop when the interval converges)":
+        return adaptive_bootstrap_mean(data, conf_lev=confidence_level, tol=tolerance, max_iterations=n_samples, seed=seed)
+    method = 'poisson' if mode == "Streaming (Poisson weights)" else 'resample'
+    means, lower_bound, upper_bound = bootstrap_mean(data, n_iterations=n_samples, conf_lev=confidence_level, seed=seed,
+                                                     method=method)
+    return means, lower_bound, upper_bound, len(means)
+
+
+# Drawing the histogram of the bootstrapped means with the original mean and the bounds of the interval.
+# The histogram is rendered through the figure cache, so going back to an earlier selection shows the cached image
+# instead of drawing it again (see 'air_quality/figures.py')
+def draw_bootstrap_histogram(means, original_mean, lower_bound, upper_bound, confidence_level, pollutant):
     # Plotting the histogram
     fig, ax = plt.subplots(figsize=(8, 6))
     ax.hist(means, bins=50, alpha=0.7, color='blue', edgecolor='black')
-    
+
     # Plotting the lines for mean, lower bound, and upper bound
-    ax.axvline(np.mean(data), color='red', linestyle='dashed', linewidth=2, label='Original Mean')
+    ax.axvline(original_mean, color='red', linestyle='dashed', linewidth=2, label='Original Mean')
     ax.axvline(lower_bound, color='orange', linestyle='dashed', linewidth=2, label=f'{confidence_level}% CI Lower Bound')
     ax.axvline(upper_bound, color='green', linestyle='dashed', linewidth=2, label=f'{confidence_level}% CI Upper Bound')
 
     # Setting the title based on the selected pollutant
-    ax.set_title(f"Bootstrapping the Mean of {selected_pollutant3}")
+    ax.set_title(f"Bootstrapping the Mean of {pollutant}")
 
     # Showing the legend
     ax.legend()
+    return fig
+
+
+# The bootstrap settings only rerun the histogram
+@st.fragment
+def bootstrap_section():
+    # Dropdown menu form the same distionary above
+    selected_pollutant3 = st.selectbox("Select a Pollutant (or All)",list(pollutants_dictionary.keys()))
+
+    # Numberical input for the CIs
+    confidence_level = st.number_input("Select Confidence Level", min_value = 0, max_value = 100, value = 95, step = 5,
+                                       key = "bootstrap_confidence")
+
+    # Choosing between a fixed number of samples and stopping as soon as the confidence interval stops changing.
+    # The streaming mode weights every value with a Poisson(1) count instead of copying the data for every sample,
+    # it uses much less memory for large datasets
+    bootstrap_mode = st.radio("Bootstrap Mode", ["Fixed number of samples", "Adaptive (stop when the interval converges)",
+                                                 "Streaming (Poisson weights)"])
+    adaptive = bootstrap_mode == "Adaptive (stop when the interval converges)"
+
+    # Numerical input for the number of samples, in adaptive mode the largest number of samples to draw is a separate input
+    # (with its own key) so switching modes does not carry one setting over to the other.
+    # Streamlit forgets the value of an input that is not shown, so the number of samples (500 at first) is kept in the
+    # session state while the adaptive input is shown, the table below always uses it
+    st.session_state.bootstrap_samples = st.session_state.get("bootstrap_samples", 500)
+    if adaptive:
+        n_samples = st.number_input("Select Maximum Number of Samples", min_value = 100, max_value = 100000, value = 100000,
+                                    step = 100, key = "bootstrap_budget")
+    else:
+        n_samples = st.number_input("Select Number of Samples", min_value = 100, max_value = 100000, step = 100,
+                                    key = "bootstrap_samples")
 
-    # Showing the plot
-    st.pyplot(fig)
+    # In adaptive mode, samples are drawn in rounds until neither bound moves by more than the tolerance between rounds.
+    # The tolerance is a percentage of the width of the interval, so the same value works for every pollutant
+    if adaptive:
+        tolerance = st.number_input("Select Tolerance (% of the Interval Width)", min_value = 0.1, max_value = 50.0,
+                                    value = 1.0, step = 0.5, format = "%.1f",
+                                    help = "Sampling stops when neither bound of the interval moved by more than this "
+                                           "percentage of the interval's width in the last round of 1000 samples.") / 100
 
-    # Display confidence intervals as text below the plot
-    st.write(f"Bootstrapped {confidence_level}% Confidence Interval for {selected_pollutant3}: ({lower_bound:.2f}, {upper_bound:.2f})")
+    # Numerical input for the random seed, using the same seed gives the same confidence interval
+    seed = st.number_input("Random Seed", min_value = 0, value = 810, step = 1, key = "bootstrap_seed")
+
+    # Selecting non-null data for the computation
+    data = combined_data[pollutants_dictionary[selected_pollutant3]].dropna()
+
+    # Perform bootstrapping
+    # Adding st.spinner to show a spinning circle while the plot is loading.
+    # Wde added this since sometimes the plot may take a while to load
+
+    with st.spinner("Generating confidence intervals....Please wait."):
+
+        #calling the bootstrap function, the result is memoized on the selection (see cached_bootstrap above)
+        means, lower_bound, upper_bound, n_used = cached_bootstrap(version, selected_pollutant3, bootstrap_mode, n_samples,
+                                                                   confidence_level, tolerance if adaptive else None, seed)
+
+        # Plotting and showing the histogram
+        st.image(render_figure(draw_bootstrap_histogram, means, np.mean(data), lower_bound, upper_bound, confidence_level,
+                               selected_pollutant3), width='stretch')
+
+        # Display confidence intervals as text below the plot
+        st.write(f"Bootstrapped {confidence_level}% Confidence Interval for {selected_pollutant3}: ({lower_bound:.2f}, {upper_bound:.2f})")
+        st.write(f"Number of samples used: {n_used}")
+
+bootstrap_section()
 
 # ------------------------------------------------  Subsection 3.1: Interpretting the plot
 st.header("Interpreting the Bootstrap Histogram")
@@ -327,3 +468,29 @@ These insights help us understand the level of uncertainty around our estimates
             visualize this uncertainty in a clear, accessible way, so we can make better-informed decisions when analyzing air 
             quality data.
 """)
+
+# ------------------------------------------------  Subsection 3.2: All sites and pollutants
+st.header("Confidence Intervals for All Sites and Pollutants")
+st.markdown("""The bootstrap above looks at one pollutant over the whole state. The table below repeats the bootstrap for every
+            location and every pollutant tracked at that location, using the confidence level, number of samples and seed selected above.
+            The groups are independent so they are computed in parallel. The table can be sorted by clicking a column and
+            downloaded as a csv file.""")
+
+# The table takes a while for a large number of samples so it is only computed on request
+# The button only reruns the table, which uses the settings selected in the bootstrap section above
+@st.fragment
+# The computed table is kept in the session state, so it is still shown after the rerun started by the download button
+def bootstrap_table_section():
+    if st.button("Compute the table for all sites and pollutants"):
+        with st.spinner("Bootstrapping all sites and pollutants....Please wait."):
+            st.session_state.bootstrap_ci_table = bootstrap_table(
+                combined_data, pollutants_dictionary, n_iterations=st.session_state.bootstrap_samples,
+                conf_lev=st.session_state.bootstrap_confidence, seed=st.session_state.bootstrap_seed)
+    if "bootstrap_ci_table" in st.session_state:
+        ci_table = st.session_state.bootstrap_ci_table
+        st.dataframe(ci_table)
+        st.download_button("Download as csv", ci_table.to_csv(index=False), file_name='bootstrap_confidence_intervals.csv',
+                           mime='text/csv')
+
+
+bootstrap_table_section()
@@ -17,43 +17,84 @@ import scipy.stats as stats
 import seaborn as sns
 import numpy as np
 import plotly.graph_objects as go
-
-# Reading the data file
-combined_data = pd.read_csv('pollution_data_2023_all.csv')
-
-# Select columns with pollutant concentrations for PCA
-pollutant_columns = [
-    'Daily Mean PM2.5 Concentration', 'Daily Max 8-hour Ozone Concentration', 
-    'Daily Max 1-hour SO2 Concentration', 'Daily Max 1-hour NO2 Concentration', 
-    'Daily Max 8-hour CO Concentration', 'Daily Mean PM10 Concentration'
-]
+from air_quality.aqi import AQI_BREAKPOINTS, categorize_aqi, wide_aqi
+from air_quality.chisquare import adjust_p_matrix, pairwise_chi2
+from air_quality.correlation import CORRELATION_POLLUTANTS, correlation_matrix, load_correlations
+from air_quality.figures import render_figure
+from air_quality.loader import POLLUTANT_COLUMNS, data_version
+from air_quality.ooc import ENGINE, SCAN_FILTERS, aqi_crosstab, moment_matrices
+from air_quality.pca import load_pca, pca_scores
+from air_quality.permutation import permutation_table
+from air_quality.shared import shared_wide
+
+# ------------------------------------    Page inputs    ------------------------------------
+# Streamlit runs the whole page again after every widget change. The inputs of the page are built once per data version
+# (and AQI pollutant) and kept by Streamlit between reruns, and every section with widgets is a fragment (st.fragment),
+# so changing a widget only reruns the section it belongs to
+
+# Building the contingency table of locations and AQI categories of the selected pollutant
+@st.cache_data(show_spinner=False)
+def load_contingency_table(version, aqi_pollutant):
+    if ENGINE == 'ooc':
+        # The out-of-core engine counts the categories one year of the partitioned dataset at a time (see 'air_quality/ooc.py')
+        contingency_table = aqi_crosstab(aqi_pollutant if aqi_pollutant in AQI_BREAKPOINTS else None, **SCAN_FILTERS)
+    else:
+        # Calculating the AQI of all pollutants at once from their concentrations
+        combined_data = shared_wide()
+        aqi_values = wide_aqi(combined_data, POLLUTANT_COLUMNS)
+        if aqi_pollutant in AQI_BREAKPOINTS:
+            aqi_values = aqi_values[aqi_pollutant]
+        else:
+            aqi_values = aqi_values.max(axis=1)
+
+        # Feature engineering part: Adding AQI category for Chi-Square
+        # Binning all AQI values at once, days without a reading of the pollutant are left without a category
+        aqi_category = pd.Series(categorize_aqi(aqi_values), index=combined_data.index, name='AQI_Category')
+
+        # Create a contingency table for 'Local Site Name' and 'AQI_Category' to pass to stats.chi2_contingency()
+        # and to use below for plotting the heatmap
+        contingency_table = pd.crosstab(combined_data['Local Site Name'], aqi_category)
+
+    # Categories and locations without any observations are removed since they have no expected frequencies
+    return contingency_table.loc[contingency_table.sum(axis=1) > 0, contingency_table.sum(axis=0) > 0]
+
+
+# Drawing a seaborn heatmap of a matrix on a new figure. The heatmaps are rendered through the figure cache, so a heatmap
+# whose matrix and settings did not change is shown from the cached image instead of being drawn again
+# (see 'air_quality/figures.py')
+def draw_heatmap(matrix, figsize, title=None, xlabel=None, ylabel=None, **heatmap_options):
+    fig, ax = plt.subplots(figsize=figsize)
+    sns.heatmap(matrix, ax=ax, **heatmap_options)
+    if title is not None:
+        ax.set_title(title)
+    if xlabel is not None:
+        ax.set_xlabel(xlabel)
+    if ylabel is not None:
+        ax.set_ylabel(ylabel)
+    return fig
+
+
+# Reading the data file as a wide table (one column per pollutant) pivoted from the long store. It is a memory-mapped file
+# shared by all sessions and processes of the host, and it is read only (see 'air_quality/shared.py')
+version = data_version()
+combined_data = shared_wide()
 
 # Setting the title
 st.title("Hypothesis Testing and Analysis")
 
-# Chi-Square Test for Categorical Data
-# This is out feature engineering part 
-def categorize_aqi(aqi_value):
-    if aqi_value <= 50:
-        return 'Good'
-    elif aqi_value <= 100:
-        return 'Moderate'
-    elif aqi_value <= 150:
-        return 'Unhealthy for Sensitive Groups'
-    elif aqi_value <= 200:
-        return 'Unhealthy'
-    elif aqi_value <= 300:
-        return 'Very Unhealthy'
-    else:
-        return 'Hazardous'
-
-# Feature engineering part: Adding AQI category for Chi-Square
-combined_data['AQI_Category'] = combined_data['Daily AQI Value'].apply(categorize_aqi)
-
-# Create a contingency table for 'Local Site Name' and 'AQI_Category' to pass to stats.chi2_contingency()
-# and to use below for plotting the heatmap
+# The out-of-core engine only calculates the contingency table and the covariance/correlation matrices,
+# the other sections of the page use the 2023 files
+if ENGINE == 'ooc':
+    st.info("""The Chi-Square tests and the covariance and correlation matrices are calculated from the partitioned dataset
+            (out-of-core engine). The permutation tests, the correlation breakdown and the PCA still use the 2023 files.""")
 
-contingency_table = pd.crosstab(combined_data['Local Site Name'], combined_data['AQI_Category'])
+# Chi-Square Test for Categorical Data
+# This is out feature engineering part
+# The AQI can be calculated from the concentration of any pollutant that has an AQI (see 'air_quality/aqi.py').
+# The overall AQI of a day is the highest AQI of all pollutants measured that day
+aqi_options = list(AQI_BREAKPOINTS.keys()) + ['All Pollutants (highest AQI)']
+aqi_pollutant = st.selectbox("Select the Pollutant Used for the AQI Category", aqi_options)
+contingency_table = load_contingency_table(version, aqi_pollutant)
 
 # Calling stats.chi2_contingency() to calculate chi^2, p-value, and degrees of freedom 
 chi2_stat, p_value, dof, expected = stats.chi2_contingency(contingency_table)
@@ -97,12 +138,9 @@ else:
 
 
 # Plotting and displaying the heatmap of the contingency table
-fig, ax = plt.subplots(figsize=(10, 8))
-sns.heatmap(contingency_table, annot=True, fmt='d', cmap='YlGnBu', cbar_kws={'label': 'Count'})
-ax.set_title('Heatmap of AQI Categories by Location')
-ax.set_xlabel('AQI Category')
-ax.set_ylabel('Location')
-st.pyplot(fig)
+st.image(render_figure(draw_heatmap, contingency_table, figsize=(10, 8), title='Heatmap of AQI Categories by Location',
+                       xlabel='AQI Category', ylabel='Location',
+                       annot=True, fmt='d', cmap='YlGnBu', cbar_kws={'label': 'Count'}), width='stretch')
 
 # Elaboration on the heatmap
 st.write("""The heatmap above visualizes the distribution of AQI categories across different locations. Each cell in the heatmap 
@@ -123,6 +161,83 @@ st.write("""- Locations with darker shades in certain AQI categories indicate mo
 - By examining the heatmap, you can identify trends, such as whether certain locations tend to have more 'Unhealthy' 
       or 'Good' air quality days.""")
 
+# ---------------------------------------   Subsection 1.2: Pairwise site comparisons -------------------------------
+st.subheader('Pairwise Site Comparisons')
+st.write("""The test above tells us that the sites differ, but not which sites differ from each other. Below, a Chi-Square test
+         is preformed on the AQI categories of every pair of sites. Since many tests are preformed at once, the p-values are
+         adjusted for multiple testing, either with the Holm method (controls the chance of any false rejection) or with the
+         Benjamini-Hochberg method (controls the expected share of false rejections among the rejected pairs).""")
+
+# The adjustment and the significance level only rerun the pairwise comparisons
+@st.fragment
+def pairwise_section():
+    # Choosing the adjustment method and the significance level
+    adjustment = st.radio("Select the P-Value Adjustment", ['Holm', 'Benjamini-Hochberg'], horizontal=True, key="pair_adjustment")
+    alpha = st.number_input("Select the Significance Level", min_value=0.001, max_value=0.5, value=0.05, step=0.01, format="%.3f",
+                            key="pair_alpha")
+
+    # Calculating the tests of all pairs at once from the contingency table (see 'air_quality/chisquare.py')
+    _, pair_p_values, _ = pairwise_chi2(contingency_table)
+    adjusted_p_values = adjust_p_matrix(pair_p_values, 'holm' if adjustment == 'Holm' else 'bh')
+    significant = adjusted_p_values < alpha
+
+    # Plotting the site by site matrix, significant pairs are highlighted and the adjusted p-value is shown on hover
+    n_pairs = len(adjusted_p_values) * (len(adjusted_p_values) - 1) // 2
+    n_significant = int(np.triu(significant.to_numpy(), k=1).sum())
+    fig = go.Figure(go.Heatmap(
+        z=significant.astype(int).where(adjusted_p_values.notna()),
+        x=adjusted_p_values.columns, y=adjusted_p_values.index,
+        customdata=adjusted_p_values, colorscale=[[0, '#e0ecf4'], [1, '#08589e']], showscale=False,
+        hovertemplate='%{y} vs %{x}<br>Adjusted p-value: %{customdata:.2e}<extra></extra>'))
+    fig.update_layout(title=f'Sites With Different AQI Categories ({n_significant} of {n_pairs} pairs significant)',
+                      height=700, yaxis_autorange='reversed')
+    st.plotly_chart(fig)
+    st.write(f"""Dark cells mark pairs of sites where the null hypothesis of independence is rejected at the {alpha} level after the
+         {adjustment} adjustment, light cells mark pairs where it is not rejected.""")
+pairwise_section()
+
+# ---------------------------------------   Subsection 1.3: Permutation tests -------------------------------
+st.subheader('Comparing Mean Concentrations Between Sites')
+st.write("""The Chi-Square tests compare the AQI categories of the sites. To compare the concentrations themselves without
+         assuming a distribution, a permutation test is preformed on the mean concentration of every pair of sites: the readings
+         of both sites are pooled and randomly split between the two sites many times, and the p-value is the share of splits
+         with a difference of means at least as large as the observed one. A pair stops early once its p-value is clearly
+         above the significance level, or clearly small enough to be significant after the adjustment selected above.
+         The smallest possible p-value is 1 / (number of permutations + 1), so more permutations are needed when many
+         pairs are compared.""")
+
+# The permutation settings and the button only rerun the permutation tests
+@st.fragment
+def permutation_section():
+    # Selecting the pollutants, the number of permutations and the seed
+    permutation_pollutant = st.selectbox("Select a Pollutant to Compare (or All)", list(POLLUTANT_COLUMNS) + ['All Pollutants'])
+    n_permutations = st.number_input("Select the Maximum Number of Permutations", min_value=1000, max_value=100000,
+                                     value=10000, step=1000)
+    permutation_seed = st.number_input("Permutation Random Seed", min_value=0, value=810, step=1)
+
+    # The adjustment and the significance level are the ones selected in the pairwise comparisons above
+    adjustment, alpha = st.session_state.pair_adjustment, st.session_state.pair_alpha
+    inputs = (permutation_pollutant, n_permutations, permutation_seed, adjustment, alpha)
+
+    # The tests take a while for many pairs so they only run on request (see 'air_quality/permutation.py').
+    # The results are kept in the session state with the inputs they were run with, so they are still shown after the rerun
+    # started by the download button, until one of the inputs changes
+    if st.button("Run the permutation tests"):
+        selected_columns = (POLLUTANT_COLUMNS if permutation_pollutant == 'All Pollutants'
+                            else {permutation_pollutant: POLLUTANT_COLUMNS[permutation_pollutant]})
+        with st.spinner("Running the permutation tests....Please wait."):
+            st.session_state.permutation_results = (inputs, permutation_table(
+                combined_data, selected_columns, n_permutations=n_permutations, alpha=alpha, seed=permutation_seed,
+                adjustment='holm' if adjustment == 'Holm' else 'bh'))
+    if st.session_state.get("permutation_results", (None,))[0] == inputs:
+        permutation_results = st.session_state.permutation_results[1]
+        st.write(f"{int(permutation_results['Significant'].sum())} of {len(permutation_results)} pairs have significantly different "
+                 f"means at the {alpha} level after the {adjustment} adjustment.")
+        st.dataframe(permutation_results)
+        st.download_button("Download as csv", permutation_results.to_csv(index=False), file_name='permutation_tests.csv',
+                           mime='text/csv')
+
+permutation_section()
 
 # ---------------------------------------   Section 2: Multivariate analysis -------------------------------
 st.header("Multivariate Analysis - Covariance and Correlation")
@@ -130,12 +245,18 @@ st.header("Multivariate Analysis - Covariance and Correlation")
 st.write("""This heatmaps visualize relationships between different pollutants using correlation and covariance. 
     These heatmaps provide insights into how pollutants in the air are related to each other.""")
 
-# Filter the combined_data DataFrame to only include the pollutant columns
-pollutant_data = combined_data[pollutant_columns]
-
-# Calculating the correlation matrix and covariance matrix
-corr_matrix = pollutant_data.corr()
-cov_matrix = pollutant_data.cov()
+# Every cell of the matrices uses the days where both pollutants were measured at the same site, and the number of those
+# days is kept next to it since most pairs of pollutants are only measured together at a few sites
+if ENGINE == 'ooc':
+    # The out-of-core engine accumulates the sums of every pair of pollutants one year at a time
+    cov_matrix, corr_matrix, count_matrix = moment_matrices(CORRELATION_POLLUTANTS, **SCAN_FILTERS)
+else:
+    # Calculating the correlation matrix, covariance matrix and overlap counts in one pass over the pollutant columns,
+    # the result is cached per data version (see 'air_quality/correlation.py')
+    correlations = load_correlations()
+    corr_matrix = correlation_matrix(correlations, 'Correlation')
+    cov_matrix = correlation_matrix(correlations, 'Covariance')
+    count_matrix = correlation_matrix(correlations, 'N')
 # ---------------------------------------   Subection 2.1: covariance matrix -------------------------------
 st.subheader("Covariance Heatmap")
 st.markdown("""The correlatione heatmap shows the covariance between different features of a dataset. Covariance is a measure of how much two 
@@ -143,11 +264,9 @@ st.markdown("""The correlatione heatmap shows the covariance between different f
     - A positive covariance means that as one variable increases, the other also also increases.
     - A negative covariance means that as one variable increases, the other decreases decreases.""")
 
-plt.figure(figsize=(14, 10))
-# Plotting covariance heatmap using seaborn
-sns.heatmap(cov_matrix, annot=True, cmap='YlGnBu', fmt='.2f', cbar=True, linewidths=0.5, square=True)
-# Showing the plot
-st.pyplot(plt)
+# Plotting covariance heatmap using seaborn and showing the plot
+st.image(render_figure(draw_heatmap, cov_matrix, figsize=(14, 10),
+                       annot=True, cmap='YlGnBu', fmt='.2f', cbar=True, linewidths=0.5, square=True), width='stretch')
 
 
 
@@ -160,14 +279,52 @@ st.write("""The correlation heatmap shows how different pollutants are linearly
          the opposite direction.
 - A value close to 0 means that there is no linear correlation.
 """)
-plt.figure(figsize=(14, 10))
-# Plotting correlation heatmap using seaborn
-sns.heatmap(corr_matrix, annot=True, cmap='YlGnBu', fmt='.2f', cbar=True, linewidths=0.5, square=True)
-# Showing the plot
-st.pyplot(plt)
-
+# Plotting correlation heatmap using seaborn and showing the plot
+st.image(render_figure(draw_heatmap, corr_matrix, figsize=(14, 10),
+                       annot=True, cmap='YlGnBu', fmt='.2f', cbar=True, linewidths=0.5, square=True), width='stretch')
+
+
+# ---------------------------------------   Subection 2.3: Overlap counts -------------------------------
+st.subheader("Number of Overlapping Readings")
+st.write("""Each cell of the matrices above is calculated from the days where both pollutants were measured at the same site.
+    The heatmap below shows the number of those days for every pair. Pairs with few overlapping days give less reliable values.""")
+st.image(render_figure(draw_heatmap, count_matrix, figsize=(14, 10),
+                       annot=True, cmap='YlGnBu', fmt='d', cbar=True, linewidths=0.5, square=True), width='stretch')
+
+# ---------------------------------------   Subection 2.4: Correlation by site and month -------------------------------
+st.subheader("Correlation by Site and Month")
+st.write("""A correlation over the whole state can come from a few sites or a few months. The plot below breaks the
+    correlation of two pollutants down by site or by month, with the number of overlapping days of every bar shown on hover.""")
+
+# The selections below only rerun the breakdown plot
+@st.fragment
+def breakdown_section():
+    # Selecting the pair of pollutants, the breakdown and the smallest number of overlapping days shown
+    pair_columns = st.columns(2)
+    pollutant_a = pair_columns[0].selectbox("Select the First Pollutant", CORRELATION_POLLUTANTS, index=0)
+    pollutant_b = pair_columns[1].selectbox("Select the Second Pollutant", CORRELATION_POLLUTANTS,
+                                            index=CORRELATION_POLLUTANTS.index('PM10'))
+    breakdown = st.radio("Break Down By", ['Local Site Name', 'Month'], horizontal=True,
+                         format_func=lambda by: 'Site' if by == 'Local Site Name' else by)
+    min_overlap = st.number_input("Minimum Number of Overlapping Days", min_value=2, value=10, step=1)
+
+    # Looking up the pair in the stack of matrices of every site or month, which is calculated in one call per data version
+    stacked = load_correlations(breakdown)
+    stacked = stacked[(stacked['Variable A'] == POLLUTANT_COLUMNS[pollutant_a])
+                      & (stacked['Variable B'] == POLLUTANT_COLUMNS[pollutant_b]) & (stacked['N'] >= min_overlap)]
+    if stacked.empty:
+        st.write(f"No {'site' if breakdown == 'Local Site Name' else 'month'} measured {pollutant_a} and {pollutant_b} "
+                 f"together on at least {min_overlap} days.")
+    else:
+        fig = go.Figure(go.Bar(x=stacked[breakdown], y=stacked['Correlation'], customdata=stacked['N'],
+                               hovertemplate='%{x}<br>Correlation: %{y:.2f}<br>Overlapping days: %{customdata}<extra></extra>'))
+        fig.update_layout(title=f'Correlation of {pollutant_a} and {pollutant_b} by '
+                                f"{'Site' if breakdown == 'Local Site Name' else 'Month'}",
+                          yaxis_title='Correlation', yaxis_range=[-1, 1])
+        st.plotly_chart(fig)
+breakdown_section()
 
-# ---------------------------------------   Subection 2.3: Insights -------------------------------
+# ---------------------------------------   Subection 2.5: Insights -------------------------------
 
 st.subheader("Insights from the Heatmaps")
 st.write("""- Covariance Heatmap: The covariance matrix shows covariance of criteria pollutant records over time. Laeger positive 
@@ -179,4 +336,61 @@ st.write("""- Correlation Heatmap: Pairs of pollutants with strong correlations
       `PM2.5` and `CO` which is suggested to be positively correlated confirmed by the heatmap although it suggested that they might share a confounder in 'PM10'.\n""")
 
 
-
+# ---------------------------------------   Section 3: Principal component analysis -------------------------------
+st.header("Principal Component Analysis")
+st.write("""Principal Component Analysis (PCA) finds the combinations of pollutants that explain most of the variation in the data.
+    The concentrations are standardized first since every pollutant is measured in different units. Most sites do not measure
+    every pollutant, so days with missing pollutants are either left out (only days where every selected pollutant was
+    measured are used) or the missing pollutants are filled with their mean. The components are fitted once per data version
+    (see 'air_quality/pca.py').""")
+
+# The selections below only rerun the principal component analysis
+@st.fragment
+def pca_section():
+    # Selecting the pollutants and how missing pollutants are handled
+    pca_pollutants = st.multiselect("Select the Pollutants Used for the PCA", CORRELATION_POLLUTANTS, default=CORRELATION_POLLUTANTS)
+    pca_missing = st.radio("Days With Missing Pollutants", ['complete', 'mean'], horizontal=True,
+                           format_func=lambda missing: 'Leave out' if missing == 'complete' else 'Fill with the mean')
+
+    pca_table = None
+    if len(pca_pollutants) < 2:
+        st.write("Select at least two pollutants.")
+    else:
+        try:
+            pca_table = load_pca(pca_pollutants, pca_missing).set_index('Component')
+        except ValueError:
+            st.write("Not enough days have all the selected pollutants, select fewer pollutants or fill the missing ones.")
+
+    if pca_table is not None:
+        components = pca_table.drop(index=['Mean', 'Scale'])
+
+        # ---------------------------------------   Subection 3.1: Explained variance -------------------------------
+        st.subheader("Explained Variance")
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=components.index, y=components['Explained Variance Ratio'], name='Component'))
+        fig.add_trace(go.Scatter(x=components.index, y=components['Explained Variance Ratio'].cumsum(), name='Cumulative'))
+        fig.update_layout(yaxis_title='Share of the Variance', yaxis_range=[0, 1])
+        st.plotly_chart(fig)
+
+        # ---------------------------------------   Subection 3.2: Loadings -------------------------------
+        st.subheader("Loadings")
+        st.write("""The loadings show how much every pollutant contributes to every component. Pollutants with large loadings of the
+        same sign in a component tend to rise and fall together.""")
+        loadings = components[[POLLUTANT_COLUMNS[pollutant] for pollutant in pca_pollutants]]
+        loadings.columns = pca_pollutants
+        st.image(render_figure(draw_heatmap, loadings, figsize=(10, 6),
+                               annot=True, cmap='RdBu_r', center=0, fmt='.2f', cbar=True, linewidths=0.5), width='stretch')
+
+        # ---------------------------------------   Subection 3.3: Scores -------------------------------
+        st.subheader("Days on the First Two Components")
+        scores = pca_scores(pca_table.reset_index(), combined_data, pca_missing)
+        scores['Local Site Name'] = combined_data.loc[scores.index, 'Local Site Name']
+        fig = go.Figure()
+        for site, site_scores in scores.groupby('Local Site Name'):
+            fig.add_trace(go.Scattergl(x=site_scores['PC1'], y=site_scores['PC2'], mode='markers', name=site,
+                                       marker={'size': 4}))
+        fig.update_layout(xaxis_title='PC1', yaxis_title='PC2', legend_title='Locations')
+        st.plotly_chart(fig)
+
+
+pca_section()